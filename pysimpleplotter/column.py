@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+from dataclasses import dataclass
+from enum import Enum
+from functools import cached_property
+from typing import Optional, Tuple
+
+from numpy import float64, fmax, fmin, int64, nan, ndarray, where
+from pandas import Categorical, Series
+
+
+# Epoch nanoseconds marking a missing datetime, like pandas' NaT
+NAT = int64(-(2**63))
+
+
+def limits(values: ndarray) -> Tuple[float, float]:
+    """Finds the lowest and highest value ignoring NaN, NaN if there are none."""
+    if len(values) == 0:
+        return nan, nan
+    # fmin and fmax skip NaN without nanmin's all-NaN warning
+    return float(fmin.reduce(values)), float(fmax.reduce(values))
+
+
+class ColumnType(Enum):
+    FLOAT = "float"
+    INT = "int"
+    DATETIME = "datetime"
+    CATEGORY = "category"
+
+
+@dataclass(frozen=True)
+class Column:
+    """A parsed column in its compact storage.
+
+    Attributes:
+        values: float64 or int64 numbers, int64 epoch nanoseconds for
+            datetimes, or int32 codes into categories with -1 for missing
+        kind: The ColumnType of the values
+        categories: The distinct strings of a categorical column
+    """
+
+    values: ndarray
+    kind: ColumnType = ColumnType.FLOAT
+    categories: Optional[ndarray] = None
+
+    @cached_property
+    def numeric(self) -> ndarray:
+        """The values as float64 for computation, with NaN for missing."""
+        if self.kind == ColumnType.FLOAT:
+            return self.values
+        if self.kind == ColumnType.DATETIME:
+            numeric = where(self.values == NAT, nan, self.values.astype(float64))
+        elif self.kind == ColumnType.CATEGORY:
+            numeric = where(self.values < 0, nan, self.values.astype(float64))
+        else:
+            numeric = self.values.astype(float64)
+        numeric.setflags(write=False)
+        return numeric
+
+    @cached_property
+    def limits(self) -> Tuple[float, float]:
+        """The lowest and highest value, NaN if there are none."""
+        return limits(self.numeric)
+
+    @cached_property
+    def dates(self) -> ndarray:
+        """A datetime64 view of datetime values."""
+        return self.values.view("datetime64[ns]")
+
+    def plottable(self) -> ndarray:
+        # Cached arrays keep their identity, which the renderer compares
+        if self.kind == ColumnType.DATETIME:
+            return self.dates
+        return self.numeric
+
+    def series(self, name: str) -> Series:
+        if self.kind == ColumnType.DATETIME:
+            return Series(self.values.view("datetime64[ns]"), name=name, copy=False)
+        if self.kind == ColumnType.CATEGORY:
+            return Series(
+                Categorical.from_codes(self.values, self.categories), name=name
+            )
+        return Series(self.values, name=name, copy=False)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import bz2
+import gzip
+import lzma
+from enum import Enum
+from os.path import getsize
+from typing import BinaryIO, List, Optional, Tuple
+from zipfile import ZipFile, ZipInfo
+
+
+class Compression(Enum):
+    GZIP = "gzip"
+    XZ = "xz"
+    BZ2 = "bz2"
+    ZIP = "zip"
+
+
+MAGIC = {
+    b"\x1f\x8b": Compression.GZIP,
+    b"\xfd7zXZ\x00": Compression.XZ,
+    b"BZh": Compression.BZ2,
+    b"PK\x03\x04": Compression.ZIP,
+    b"PK\x05\x06": Compression.ZIP,  # An empty archive
+}
+
+EXTENSIONS = "*.gz *.xz *.bz2 *.zip"
+
+
+def detect(file_name: str) -> Optional[Compression]:
+    """Finds the compression of a file from its magic bytes."""
+    with open(file_name, "rb") as file:
+        head = file.read(max(len(magic) for magic in MAGIC))
+    for magic, compression in MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def members(file_name: str) -> List[str]:
+    """Lists the files in a zip archive."""
+    with ZipFile(file_name) as archive:
+        return [info.filename for info in archive.infolist() if not info.is_dir()]
+
+
+def member_info(file_name: str, member: str) -> ZipInfo:
+    with ZipFile(file_name) as archive:
+        return archive.getinfo(member)
+
+
+def span(
+    file_name: str, compression: Optional[Compression], member: Optional[str] = None
+) -> Tuple[int, int]:
+    """Finds the offset and length of the compressed bytes of a file.
+
+    For a zip archive these are the bytes of one member.
+    """
+    if compression != Compression.ZIP:
+        return 0, getsize(file_name)
+    info = member_info(
+        file_name, member if member is not None else members(file_name)[0]
+    )
+    return info.header_offset, info.compress_size
+
+
+def decompress(
+    raw: BinaryIO, compression: Optional[Compression], member: Optional[str] = None
+) -> BinaryIO:
+    """Wraps a compressed binary file in a stream of its decompressed bytes.
+
+    Nothing is written to disk, and raw.tell() keeps counting the compressed
+    bytes consumed so far.
+    """
+    if compression is None:
+        return raw
+    if compression == Compression.GZIP:
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if compression == Compression.XZ:
+        return lzma.LZMAFile(raw, "rb")
+    if compression == Compression.BZ2:
+        return bz2.BZ2File(raw, "rb")
+    archive = ZipFile(raw)
+    if member is None:
+        member = next(info for info in archive.infolist() if not info.is_dir())
+    return archive.open(member)
@@ -1,53 +1,280 @@
 #!/usr/bin/env python3
 
-from dataclasses import dataclass
-from re import match, search
-from typing import List, Tuple
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from functools import partial
+from hashlib import blake2b
+from itertools import islice
+from os.path import getsize
+from typing import (
+    BinaryIO,
+    Callable,
+    FrozenSet,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
-from numpy import float64
-from pandas import DataFrame
+from numpy import concatenate, flatnonzero, frombuffer, ndarray, uint8
+from pandas.errors import ParserError
 
+from pysimpleplotter.column import Column, ColumnType
+from pysimpleplotter.compression import (
+    Compression,
+    decompress,
+    detect,
+    member_info,
+    span,
+)
+from pysimpleplotter.dialect import (
+    Dialect,
+    NumericLocale,
+    infer_types,
+    is_header,
+    line_terminator,
+    sniff,
+)
 from pysimpleplotter.exceptions import UnknownFileTypeError
+from pysimpleplotter.frame import LazyFrame
+from pysimpleplotter.lineindex import LineIndex, LineIndexBuilder, read_lines
+
+
+ENCODING = "iso-8859-1"
+SAMPLE_LINES = 64
+TAIL_BYTES = 1 << 16
+# Bytes scanned at a time while loading
+READ_SIZE = 1 << 20
+FINGERPRINT_BLOCKS = 16
+FINGERPRINT_BLOCK_SIZE = 1 << 12
+
+
+def line_bounds(block: bytes, terminator: str) -> Tuple[ndarray, ndarray]:
+    """Finds where the lines of a block ending with a terminator start and end."""
+    ends = flatnonzero(frombuffer(block, uint8) == ord(terminator))
+    return concatenate(([0], ends[:-1] + 1)), ends
+
+
+def line_at(block: bytes, i: int, terminator: str) -> str:
+    starts, ends = line_bounds(block, terminator)
+    return block[starts[i] : ends[i]].decode(ENCODING)
+
+
+def count_fields(block: bytes, dialect: Dialect, col_count: int) -> ndarray:
+    """Counts the fields of every line of a block ending with a terminator.
+
+    Lines are counted in bulk, and only the lines whose count is not col_count
+    are decoded and counted again, since decoding can change which characters
+    are whitespace.
+    """
+    counts = dialect.count_lines(block)
+    mismatched = flatnonzero(counts != col_count)
+    if len(mismatched):
+        starts, ends = line_bounds(block, dialect.terminator)
+        for i in mismatched:
+            line = block[starts[i] : ends[i]].decode(ENCODING)
+            counts[i] = dialect.count(line)
+    return counts
 
 
 @dataclass(frozen=True)
 class Dataset:
+    """A delimited file, optionally compressed, and how to read it.
+
+    Attributes:
+        name: The name shown for the dataset
+        file_name: The path of the file
+        locale: The NumericLocale of the numbers, or None to sniff it
+        member: The file to read from a zip archive, or None for the first
+        units: Whether a sniffed locale has a units suffix even if none is seen
+    """
+
     name: str
     file_name: str
+    locale: Optional[NumericLocale] = None
+    member: Optional[str] = None
+    units: bool = False
 
-    def _dsvs(self, line: str) -> Tuple[str, ...]:
-        field_regex = r"[^\s]+"
-        sep_regex = r"[\s,]+?"
-        dsvs = ()
-        capture_field_regex = f"({field_regex})"
-        _match = search(capture_field_regex, line)
-        _line = line
-        while _match:
-            dsvs += (_match.group(1),)
-            _line = _line[_match.end() :]
-            _match = match(sep_regex + capture_field_regex, _line)
-        return dsvs
-
-    def _is_header(self, line: str) -> bool:
-        header_regex = r"[^\d\W]{2}"
-        for value in line:
-            if search(header_regex, value) and value.lower() != "nan":
-                return True
-        return False
-
-    def load(self) -> DataFrame:
-        # TODO: Detect when we need iso-8859-1 encoding with libmagic
-        with open(self.file_name, "r", encoding="iso-8859-1") as file:
-            raw_dsv = []
-            for line in file:
-                dsvs = self._dsvs(line)
-                raw_dsv.append(dsvs)
-            col_count = len(raw_dsv[-1])  # Use the last DSV line for col count
-            dsv = [values for values in raw_dsv if len(values) == col_count]
-            if self._is_header(dsv[0]):
-                cols = dsv[0]
-                df = DataFrame(dsv[1:], columns=cols, dtype=float)
+    def fingerprint(self) -> Hashable:
+        """Identifies the content of the file without reading all of it.
+
+        Files are identified by their size and a hash of evenly spaced blocks,
+        and zip members by the size and CRC in the archive. Datasets with the
+        same fingerprint load to the same columns.
+        """
+        if self.member is not None:
+            info = member_info(self.file_name, self.member)
+            return info.file_size, info.CRC, self.locale, self.units
+        size = getsize(self.file_name)
+        digest = blake2b(digest_size=16)
+        with open(self.file_name, "rb") as file:
+            for block in range(FINGERPRINT_BLOCKS):
+                offset = max(0, size - FINGERPRINT_BLOCK_SIZE) * block
+                file.seek(offset // (FINGERPRINT_BLOCKS - 1))
+                digest.update(file.read(FINGERPRINT_BLOCK_SIZE))
+        return size, digest.hexdigest(), self.locale, self.units
+
+    def _tail(self, terminator: str) -> str:
+        """Finds the last non-blank line, reading back from the end in blocks.
+
+        Reading goes on until the line's start is found, however long it is.
+        """
+        with open(self.file_name, "rb") as file:
+            position = file.seek(0, 2)
+            data = b""
+            while position > 0:
+                block_start = max(0, position - TAIL_BYTES)
+                file.seek(block_start)
+                data = file.read(position - block_start) + data
+                position = block_start
+                lines = data.split(terminator.encode())
+                # The first line may have started before the block
+                complete = lines if position == 0 else lines[1:]
+                for line in reversed(complete):
+                    if line.strip():
+                        return line.decode(ENCODING)
+        return ""
+
+    def _sample(
+        self, file: BinaryIO, compression: Optional[Compression], terminator: str
+    ) -> List[str]:
+        lines = islice(read_lines(file, terminator), SAMPLE_LINES)
+        head = [line.decode(ENCODING) for line in lines]
+        file.seek(0)
+        if compression is None:
+            return head + [self._tail(terminator)]
+        # The end of a compressed file is only reached by decompressing it all
+        return head + [next((line for line in reversed(head) if line.strip()), "")]
+
+    @contextmanager
+    def _open(
+        self, compression: Optional[Compression]
+    ) -> Iterator[Tuple[BinaryIO, BinaryIO]]:
+        """Opens the file, decompressing it as it is read.
+
+        Yields:
+            The raw file, whose position counts the compressed bytes read, and
+            the decompressed stream
+        """
+        with open(self.file_name, "rb") as raw:
+            yield raw, decompress(raw, compression, self.member)
+
+    def _read_cols(
+        self,
+        compression: Optional[Compression],
+        dialect: Dialect,
+        types: List[ColumnType],
+        skipped: FrozenSet[int],
+        row_count: int,
+        positions: List[int],
+    ) -> List[Column]:
+        """Parses columns, checking pandas split the lines as the scan did."""
+        try:
+            if compression is None:
+                cols = dialect.read(self.file_name, types, positions, skipped, ENCODING)
             else:
-                cols = [f"col{i+1}" for i in range(col_count)]
-                df = DataFrame(dsv, columns=cols, dtype=float)
-            return df
+                with self._open(compression) as (_, file):
+                    cols = dialect.read(file, types, positions, skipped, ENCODING)
+        except ParserError as e:
+            raise UnknownFileTypeError(f"Could not read {self.file_name}: {e}") from e
+        if cols and len(cols[0].values) != row_count:
+            raise UnknownFileTypeError(
+                f"Could not read {self.file_name}: expected {row_count} rows, "
+                f"found {len(cols[0].values)}"
+            )
+        return cols
+
+    def preview(self, index: LineIndex, start: int, count: int) -> List[str]:
+        """Reads count raw lines from line number start."""
+        compression = detect(self.file_name)
+        if compression is None:
+            lines = index.read_mapped(self.file_name, start, count)
+        else:
+            # Seeking a compressed stream decompresses up to the offset
+            with self._open(compression) as (_, file):
+                lines = index.read(file, start, count)
+        return [line.decode(ENCODING) for line in lines]
+
+    def load(self, progress: Optional[Callable[[int, int], None]] = None) -> LazyFrame:
+        """Finds the dialect, header and rows of the file in one pass.
+
+        The same pass builds the LineIndex of the file.
+
+        Args:
+            progress: A function called now and then with the number of
+                compressed bytes read and the total
+        """
+        # TODO: Detect when we need iso-8859-1 encoding with libmagic
+        compression = detect(self.file_name)
+        start, size = span(self.file_name, compression, self.member)
+        with self._open(compression) as (raw, file):
+            terminator = line_terminator(file.read(TAIL_BYTES))
+            file.seek(0)
+            sample = self._sample(file, compression, terminator)
+            dialect = replace(
+                sniff(sample, self.locale, self.units), terminator=terminator
+            )
+            col_count = dialect.count(sample[-1])  # Use the last line
+            if col_count == 0:
+                raise UnknownFileTypeError(f"No data found in {self.file_name}")
+            types = infer_types(
+                [
+                    dialect.split(line)
+                    for line in sample
+                    if dialect.count(line) == col_count
+                ],
+                dialect.locale,
+            )
+            # Only count fields here, columns are parsed when first used
+            cols = None
+            header = None
+            skipped = []
+            row_count = 0
+            index = LineIndexBuilder(terminator)
+            terminator_byte = terminator.encode()
+            line_number = 0
+            rest = b""
+            while True:
+                if progress is not None:
+                    progress(min(max(raw.tell() - start, 0), size), size)
+                chunk = file.read(READ_SIZE)
+                data = rest + chunk
+                # Lines are kept whole, the last may not have a terminator
+                end = data.rfind(terminator_byte) + 1 if chunk else len(data)
+                block, rest = data[:end], data[end:]
+                index.add_block(block)
+                if block and not block.endswith(terminator_byte):
+                    block += terminator_byte
+                counts = count_fields(block, dialect, col_count)
+                if cols is None:
+                    matching = flatnonzero(counts == col_count)
+                    if len(matching):
+                        first = int(matching[0])
+                        values = dialect.split(line_at(block, first, terminator))
+                        if is_header(values, types, dialect.locale):
+                            cols = values
+                            header = line_number + first
+                            counts[first] = 0
+                        else:
+                            cols = [f"col{i+1}" for i in range(col_count)]
+                mismatched = flatnonzero(counts != col_count)
+                skipped.extend((mismatched + line_number).tolist())
+                row_count += len(counts) - len(mismatched)
+                line_number += len(counts)
+                if not chunk:
+                    break
+        if progress is not None:
+            progress(size, size)
+        if cols is None:
+            raise UnknownFileTypeError(f"No data found in {self.file_name}")
+        read = partial(
+            self._read_cols,
+            compression,
+            dialect,
+            types,
+            frozenset(skipped),
+            row_count,
+        )
+        line_index = index.build(skipped, header, dialect, col_count)
+        return LazyFrame(cols, row_count, read, line_index=line_index)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+
+from csv import QUOTE_NONE
+from dataclasses import dataclass
+from re import compile
+from typing import Collection, IO, List, Optional, Sequence, Union
+
+from numpy import (
+    flatnonzero,
+    float64,
+    frombuffer,
+    fromiter,
+    int32,
+    int64,
+    ndarray,
+    searchsorted,
+    uint8,
+)
+from pandas import Series, factorize, read_csv, to_datetime, to_numeric
+
+from pysimpleplotter.column import Column, ColumnType
+
+
+# None splits on runs of whitespace, which also strips padded fields
+DELIMITERS = (None, "\t", ";", ",")
+# Wide files are sniffed from the first fields of each line only
+SNIFF_FIELDS = 64
+TYPE_SAMPLE_ROWS = 16
+TOKEN_REGEX = compile(r"[\s;]+")
+UNITS_REGEX = r"(?<=\d)\s*[^\d\s.,'+-]+$"
+UNIT_SUFFIX_REGEX = compile(UNITS_REGEX)
+UNIT_TOKEN_REGEX = compile(r"^[-+]?[\d.,']*\d(?:[eE][-+]?\d+)?\s*[^\d\s.,;'+-]+$")
+DECIMAL_COMMA_REGEX = compile(r"^[-+]?(?:\d{1,3}(?:\.\d{3})+|\d*),\d+(?:[eE][-+]?\d+)?")
+THOUSANDS_DOT_REGEX = compile(r"^[-+]?\d{1,3}(?:\.\d{3})+(?:,\d*)?(?:[^\d.,]|$)")
+THOUSANDS_COMMA_REGEX = compile(r"^[-+]?\d{1,3}(?:,\d{3}){2,}|^[-+]?\d{1,3}(?:,\d{3})+\.")
+THOUSANDS_APOSTROPHE_REGEX = compile(r"^[-+]?\d{1,3}(?:'\d{3})+")
+INT_REGEX = compile(r"^[-+]?\d+$")
+DATETIME_REGEX = compile(
+    r"^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?)?"
+    r"(?:Z|[+-]\d{2}(?::?\d{2})?)?$"
+)
+HEADER_REGEX = compile(r"[^\d\W]{2}")
+MISSING_VALUES = {"", "nan", "na", "n/a", "null", "none"}
+
+
+@dataclass(frozen=True)
+class NumericLocale:
+    decimal: str = "."
+    thousands: str = ""
+    units: bool = False
+
+    def normalize(self, value: str) -> str:
+        if self.units:
+            value = UNIT_SUFFIX_REGEX.sub("", value)
+        if self.thousands:
+            value = value.replace(self.thousands, "")
+        if self.decimal != ".":
+            value = value.replace(self.decimal, ".")
+        return value
+
+    def is_number(self, value: str) -> bool:
+        try:
+            float(self.normalize(value))
+        except ValueError:
+            return False
+        return True
+
+
+def line_terminator(head: bytes) -> str:
+    """Guesses the line ending from the start of a file.
+
+    Classic Mac files end lines with a lone carriage return, everything else
+    with a newline, which also covers carriage return and newline pairs.
+    """
+    return "\r" if b"\r" in head and b"\n" not in head else "\n"
+
+
+@dataclass(frozen=True)
+class Dialect:
+    delimiter: Optional[str] = None
+    locale: NumericLocale = NumericLocale()
+    terminator: str = "\n"
+
+    def split(self, line: str) -> List[str]:
+        if self.delimiter is None:
+            return line.split()
+        return line.rstrip("\r\n").split(self.delimiter)
+
+    def count(self, line: str) -> int:
+        """Counts the fields split would return without building them."""
+        if self.delimiter is None:
+            return len(line.split())
+        return line.rstrip("\r\n").count(self.delimiter) + 1
+
+    def count_lines(self, block: bytes) -> ndarray:
+        """Counts the fields of every line of a block ending with a terminator.
+
+        Delimiters are counted in bulk. Whitespace is split on per line, and
+        only on ASCII whitespace.
+        """
+        if self.delimiter is None:
+            lines = block.split(self.terminator.encode())[:-1]
+            return fromiter((len(line.split()) for line in lines), int64, len(lines))
+        buffer = frombuffer(block, uint8)
+        ends = flatnonzero(buffer == ord(self.terminator))
+        delimiters = flatnonzero(buffer == ord(self.delimiter))
+        counts = searchsorted(delimiters, ends)
+        counts[1:] -= counts[:-1].copy()
+        return counts + 1
+
+    def read(
+        self,
+        source: Union[str, IO],
+        types: Sequence[ColumnType],
+        usecols: Sequence[int],
+        skiprows: Collection[int] = (),
+        encoding: Optional[str] = None,
+    ) -> List[Column]:
+        """Parses the usecols fields of every line not in skiprows.
+
+        Tokenizing and number conversion happen in pandas' C parser, and only
+        the requested columns are converted and kept. Columns it cannot
+        convert, and all columns with a units suffix, fall back to
+        parse_floats. Datetime and categorical columns are read as strings
+        and converted in bulk.
+        """
+        text = (ColumnType.DATETIME, ColumnType.CATEGORY)
+        dtype = {
+            i: object for i in usecols if self.locale.units or types[i] in text
+        }
+        frame = read_csv(
+            source,
+            sep=r"\s+" if self.delimiter is None else self.delimiter,
+            header=None,
+            names=list(range(len(types))),
+            usecols=list(usecols),
+            skiprows=skiprows,
+            dtype=dtype or None,
+            decimal=self.locale.decimal,
+            thousands=self.locale.thousands or None,
+            quoting=QUOTE_NONE,
+            # The default also ends lines at carriage return and newline pairs
+            lineterminator=None if self.terminator == "\n" else self.terminator,
+            encoding=encoding,
+            engine="c",
+        )
+        return [self.column(frame[i], types[i]) for i in usecols]
+
+    def column(self, values: Series, kind: ColumnType) -> Column:
+        if kind == ColumnType.DATETIME:
+            return Column(parse_datetimes(values), kind)
+        if kind == ColumnType.CATEGORY:
+            codes, categories = factorize(values.to_numpy(dtype=object))
+            return Column(codes.astype(int32), kind, categories)
+        if kind == ColumnType.INT and values.dtype.kind in "iu":
+            return Column(values.to_numpy(dtype=int64), kind)
+        if values.dtype.kind in "biuf":
+            return Column(values.to_numpy(dtype=float64))
+        return Column(parse_floats(values, self.locale))
+
+
+def parse_floats(values: Sequence[str], locale: NumericLocale) -> ndarray:
+    """Converts a column of fields to float64 in bulk.
+
+    Locale handling is done with vectorized string replacement so the number
+    conversion itself stays in pandas' C parser. Fields which are not numbers
+    become NaN.
+    """
+    strings = Series(values, dtype=object)
+    if locale.units:
+        strings = strings.str.replace(UNITS_REGEX, "", regex=True)
+    if locale.thousands:
+        strings = strings.str.replace(locale.thousands, "", regex=False)
+    if locale.decimal != ".":
+        strings = strings.str.replace(locale.decimal, ".", regex=False)
+    return to_numeric(strings.str.strip(), errors="coerce").to_numpy(dtype=float64)
+
+
+def parse_datetimes(values: Sequence[str]) -> ndarray:
+    """Converts ISO 8601 strings to int64 UTC epoch nanoseconds in bulk."""
+    times = to_datetime(
+        Series(values, dtype=object), format="ISO8601", utc=True, errors="coerce"
+    )
+    return times.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]").view(int64)
+
+
+def is_missing(value: str) -> bool:
+    return value.lower() in MISSING_VALUES
+
+
+def fits_type(value: str, kind: ColumnType, locale: NumericLocale) -> bool:
+    if kind == ColumnType.INT:
+        return bool(INT_REGEX.match(locale.normalize(value)))
+    if kind == ColumnType.FLOAT:
+        return locale.is_number(value)
+    if kind == ColumnType.DATETIME:
+        return bool(DATETIME_REGEX.match(value))
+    return True
+
+
+def is_header(
+    values: Sequence[str], types: Sequence[ColumnType], locale: NumericLocale
+) -> bool:
+    """Checks if a row is column names rather than data of the given types."""
+    # Any text fits a categorical column, so judge all-text rows as numbers
+    if all(kind == ColumnType.CATEGORY for kind in types):
+        types = [ColumnType.FLOAT] * len(types)
+    for value, kind in zip(values, types):
+        if (
+            kind != ColumnType.CATEGORY
+            and HEADER_REGEX.search(value)
+            and not is_missing(value)
+            and not fits_type(value, kind, locale)
+        ):
+            return True
+    return False
+
+
+def infer_type(values: Sequence[str], locale: NumericLocale) -> ColumnType:
+    values = [value for value in values if not is_missing(value)]
+    for kind in (ColumnType.INT, ColumnType.FLOAT, ColumnType.DATETIME):
+        if all(fits_type(value, kind, locale) for value in values):
+            return kind
+    return ColumnType.CATEGORY
+
+
+def infer_types(
+    rows: Sequence[Sequence[str]], locale: NumericLocale
+) -> List[ColumnType]:
+    """Infers column types from sample rows which all have the same length.
+
+    The first row is ignored when there are others since it may be a header.
+    """
+    if len(rows) > 1:
+        rows = rows[1:][-TYPE_SAMPLE_ROWS:]
+    return [infer_type(values, locale) for values in zip(*rows)]
+
+
+def split_fields(line: str, locale: NumericLocale) -> List[str]:
+    """Splits a line on the first delimiter it has, keeping spaced units whole.
+
+    Lines without one of the delimiters are split on whitespace.
+    """
+    for delimiter in DELIMITERS[1:]:
+        if delimiter in line and delimiter not in (locale.decimal, locale.thousands):
+            fields = line.strip().split(delimiter)[:SNIFF_FIELDS]
+            return [field.strip() for field in fields]
+    return TOKEN_REGEX.split(line.strip())[:SNIFF_FIELDS]
+
+
+def sniff_locale(lines: Sequence[str]) -> NumericLocale:
+    rows = [TOKEN_REGEX.split(line.strip())[:SNIFF_FIELDS] for line in lines]
+    # Commas are only decimal marks when something else separates the fields
+    multi_field = sum(len(row) > 1 for row in rows) > len(rows) // 2
+    tokens = [token for row in rows for token in row]
+    decimal = "."
+    thousands = ""
+    if multi_field and any(DECIMAL_COMMA_REGEX.match(t) for t in tokens):
+        if any(THOUSANDS_COMMA_REGEX.match(t) for t in tokens):
+            thousands = ","
+        else:
+            decimal = ","
+            if any(THOUSANDS_DOT_REGEX.match(t) for t in tokens):
+                thousands = "."
+    elif any(THOUSANDS_APOSTROPHE_REGEX.match(t) for t in tokens):
+        thousands = "'"
+    locale = NumericLocale(decimal, thousands)
+    for line in lines:
+        row = split_fields(line, locale)
+        has_unit = any(UNIT_TOKEN_REGEX.match(t) for t in row)
+        if has_unit and all(
+            UNIT_TOKEN_REGEX.match(t) or locale.is_number(t) for t in row
+        ):
+            return NumericLocale(decimal, thousands, units=True)
+    return locale
+
+
+def sniff(
+    sample: Sequence[str],
+    locale: Optional[NumericLocale] = None,
+    units: bool = False,
+) -> Dialect:
+    """Guesses the delimiter and numeric locale from a sample of lines.
+
+    The last line of the sample is assumed to be data, matching how the loader
+    counts columns.
+
+    Args:
+        sample: The lines to sniff
+        locale: The NumericLocale of the numbers, or None to sniff it
+        units: Whether a sniffed locale has a units suffix even if none is seen
+    """
+    lines = [line for line in sample if line.strip()]
+    if locale is None:
+        locale = sniff_locale(lines) if lines else NumericLocale()
+        if units:
+            locale = NumericLocale(locale.decimal, locale.thousands, units=True)
+    if not lines:
+        return Dialect(None, locale)
+    # A single character delimiter is cheaper to count than whitespace runs
+    # but is only safe when no line is padded with whitespace
+    unpadded = all(line.rstrip("\r\n") == line.strip() for line in lines)
+    best = Dialect(None, locale)
+    best_score = (-1, -1, -1)
+    for delimiter in DELIMITERS:
+        if delimiter in (locale.decimal, locale.thousands):
+            continue
+        dialect = Dialect(delimiter, locale)
+        rows = [dialect.split(line) for line in lines]
+        col_count = len(rows[-1])
+        if col_count < 2:
+            continue
+        matching = [row for row in rows if len(row) == col_count]
+        typed = sum(
+            locale.is_number(value) or bool(DATETIME_REGEX.match(value))
+            for row in matching
+            for value in row[:SNIFF_FIELDS]
+        )
+        score = (typed, len(matching), int(unpadded and delimiter is not None))
+        if score > best_score:
+            best = dialect
+            best_score = score
+    return best
@@ -1,3 +1,11 @@
 #!/usr/bin/env python3
 class UnknownFileTypeError(Exception):
     pass
+
+
+class ProcessingError(Exception):
+    pass
+
+
+class ExpressionError(Exception):
+    pass
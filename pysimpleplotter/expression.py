@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+import ast
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from re import match, sub
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+from numpy import (
+    absolute,
+    add,
+    arccos,
+    arcsin,
+    arctan,
+    cos,
+    empty,
+    errstate,
+    exp,
+    float64,
+    floor_divide,
+    log,
+    log10,
+    mod,
+    multiply,
+    nanmax,
+    nanmean,
+    nanmedian,
+    nanmin,
+    nanstd,
+    nansum,
+    ndarray,
+    negative,
+    positive,
+    power,
+    sin,
+    sqrt,
+    subtract,
+    tan,
+    true_divide,
+)
+
+from pysimpleplotter.exceptions import ExpressionError
+
+
+CHUNK_SIZE = 1 << 16
+
+BINARY_OPERATORS = {
+    ast.Add: add,
+    ast.Sub: subtract,
+    ast.Mult: multiply,
+    ast.Div: true_divide,
+    ast.FloorDiv: floor_divide,
+    ast.Mod: mod,
+    ast.Pow: power,
+}
+
+UNARY_OPERATORS = {
+    ast.USub: negative,
+    ast.UAdd: positive,
+}
+
+FUNCTIONS = {
+    "abs": absolute,
+    "sqrt": sqrt,
+    "exp": exp,
+    "log": log,
+    "log10": log10,
+    "sin": sin,
+    "cos": cos,
+    "tan": tan,
+    "arcsin": arcsin,
+    "arccos": arccos,
+    "arctan": arctan,
+}
+
+# Methods which reduce a whole column to a number, like col2.max()
+REDUCTIONS = {
+    "max": nanmax,
+    "min": nanmin,
+    "mean": nanmean,
+    "median": nanmedian,
+    "std": partial(nanstd, ddof=1),
+    "sum": nansum,
+}
+
+Value = Union[float, ndarray]
+# Column names and evaluated reductions for the rows being evaluated
+Environment = Dict[Any, Any]
+
+
+def scratch(*operands: Tuple["Node", Value]) -> Optional[ndarray]:
+    """Finds an operand array the evaluation owns, to reuse as the output."""
+    for node, value in operands:
+        if isinstance(value, ndarray) and not isinstance(node, Reference):
+            return value
+    return None
+
+
+@dataclass(frozen=True)
+class Constant:
+    value: float
+
+    def evaluate(self, env: Environment, start: int, stop: int) -> Value:
+        return self.value
+
+
+@dataclass(frozen=True)
+class Reference:
+    name: str
+
+    def evaluate(self, env: Environment, start: int, stop: int) -> Value:
+        return env[self.name][start:stop]
+
+
+@dataclass(frozen=True)
+class Unary:
+    operator: Callable
+    operand: "Node"
+
+    def evaluate(self, env: Environment, start: int, stop: int) -> Value:
+        operand = self.operand.evaluate(env, start, stop)
+        return self.operator(operand, out=scratch((self.operand, operand)))
+
+
+@dataclass(frozen=True)
+class Binary:
+    operator: Callable
+    left: "Node"
+    right: "Node"
+
+    def evaluate(self, env: Environment, start: int, stop: int) -> Value:
+        left = self.left.evaluate(env, start, stop)
+        right = self.right.evaluate(env, start, stop)
+        out = scratch((self.left, left), (self.right, right))
+        return self.operator(left, right, out=out)
+
+
+@dataclass(frozen=True)
+class Reduction:
+    """A whole column reduction, evaluated once before the rows."""
+
+    function: Callable
+    operand: "Node"
+
+    def evaluate(self, env: Environment, start: int, stop: int) -> Value:
+        return env[self]
+
+
+Node = Union[Constant, Reference, Unary, Binary, Reduction]
+
+
+@dataclass(frozen=True)
+class Expression:
+    """A compiled expression over the columns of a dataset.
+
+    Rows are evaluated in chunks of CHUNK_SIZE so temporaries stay small, and
+    each operator writes into the temporaries of its operands when it can.
+
+    Attributes:
+        text: The expression as written
+        node: The root of the compiled expression tree
+        columns: The names of the columns the expression uses
+        reductions: The reductions in the expression, innermost first
+    """
+
+    text: str
+    node: Node
+    columns: Tuple[str, ...]
+    reductions: Tuple[Reduction, ...]
+
+    def evaluate(self, columns: Mapping[str, ndarray], length: int) -> ndarray:
+        env: Environment = dict(columns)
+        out = empty(length, dtype=float64)
+        with errstate(all="ignore"):
+            for reduction in self.reductions:
+                values = self.rows(reduction.operand, env, length)
+                env[reduction] = float(reduction.function(values))
+            self.fill(self.node, env, out)
+        return out
+
+    def rows(self, node: Node, env: Environment, length: int) -> Value:
+        if isinstance(node, Reference):
+            return env[node.name]
+        return self.fill(node, env, empty(length, dtype=float64))
+
+    def fill(self, node: Node, env: Environment, out: ndarray) -> ndarray:
+        for start in range(0, len(out), CHUNK_SIZE):
+            stop = min(start + CHUNK_SIZE, len(out))
+            out[start:stop] = node.evaluate(env, start, stop)
+        return out
+
+
+class Compiler:
+    """Compiles a Python expression AST into an expression tree.
+
+    Attributes:
+        names: A dict of placeholder identifiers mapped to quoted column names
+        columns: The names of the columns referenced so far
+        reductions: The reductions compiled so far, innermost first
+    """
+
+    def __init__(self, names: Dict[str, str]):
+        self.names = names
+        self.columns: List[str] = []
+        self.reductions: List[Reduction] = []
+
+    def compile(self, node: ast.AST) -> Node:
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(
+                node.value, (int, float)
+            ):
+                raise ExpressionError(f"Unsupported constant {node.value!r}")
+            return Constant(float(node.value))
+        if isinstance(node, ast.Name):
+            name = self.names.get(node.id, node.id)
+            if name not in self.columns:
+                self.columns.append(name)
+            return Reference(name)
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            return Unary(UNARY_OPERATORS[type(node.op)], self.compile(node.operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            return Binary(
+                BINARY_OPERATORS[type(node.op)],
+                self.compile(node.left),
+                self.compile(node.right),
+            )
+        if isinstance(node, ast.Call) and not node.keywords:
+            return self.call(node)
+        raise ExpressionError(f"Unsupported syntax {ast.unparse(node)}")
+
+    def call(self, node: ast.Call) -> Node:
+        if isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS:
+            if len(node.args) != 1:
+                raise ExpressionError(f"{node.func.id} takes one argument")
+            return Unary(FUNCTIONS[node.func.id], self.compile(node.args[0]))
+        if (
+            isinstance(node.func, ast.Attribute)
+            and node.func.attr in REDUCTIONS
+            and not node.args
+        ):
+            reduction = Reduction(
+                REDUCTIONS[node.func.attr], self.compile(node.func.value)
+            )
+            self.reductions.append(reduction)
+            return reduction
+        raise ExpressionError(f"Unsupported function {ast.unparse(node.func)}")
+
+
+@lru_cache(maxsize=256)
+def compile_expression(text: str) -> Expression:
+    """Compiles an expression like col2 / col2.max().
+
+    Column names which are not identifiers are quoted with backticks, like
+    `Weight (%)` * 10.
+    """
+    names: Dict[str, str] = {}
+
+    def quote(m) -> str:
+        placeholder = f"_col{len(names)}_"
+        names[placeholder] = m.group(1)
+        return placeholder
+
+    source = sub(r"`([^`]+)`", quote, text)
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression {text}: {e.msg}") from e
+    compiler = Compiler(names)
+    node = compiler.compile(tree.body)
+    return Expression(
+        text.strip(), node, tuple(compiler.columns), tuple(compiler.reductions)
+    )
+
+
+def parse_definition(text: str) -> Tuple[Optional[str], Expression]:
+    """Splits a definition like name = expression into its name and expression.
+
+    The name is None when the text is only an expression.
+    """
+    m = match(r"\s*(`[^`]+`|[^\W\d]\w*)\s*=(?!=)(.*)$", text)
+    if m is None:
+        return None, compile_expression(text)
+    return m.group(1).strip("`"), compile_expression(m.group(2))
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from pandas import Index, RangeIndex, Series
+
+from pysimpleplotter.column import Column
+from pysimpleplotter.exceptions import ExpressionError
+from pysimpleplotter.expression import Expression
+from pysimpleplotter.lineindex import LineIndex
+
+
+class Table:
+    """The column names and rows of a table, as a DataFrame has them.
+
+    Columns are looked up by position, so renaming them keeps the columns
+    cached under their positions.
+
+    Attributes:
+        length: The number of rows
+    """
+
+    def __init__(self, columns: Sequence[str], length: int):
+        self._columns = Index(columns)
+        self.length = length
+
+    @property
+    def columns(self) -> Index:
+        return self._columns
+
+    @columns.setter
+    def columns(self, columns: Sequence[str]) -> None:
+        if len(columns) != len(self._columns):
+            raise ValueError(
+                f"Expected {len(self._columns)} column names, got {len(columns)}"
+            )
+        self._columns = Index(columns)
+
+    @property
+    def index(self) -> RangeIndex:
+        return RangeIndex(self.length)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+
+    def position(self, name: str) -> int:
+        position = self._columns.get_loc(name)
+        if not isinstance(position, int):
+            raise KeyError(f"Column name {name} is not unique")
+        return position
+
+
+class LazyFrame(Table):
+    """A table whose columns are parsed the first time they are used.
+
+    Supports the parts of the DataFrame interface the plotter uses, so column
+    lookups, renames and lengths work without parsing columns nobody asked for.
+
+    Attributes:
+        header: The column names the file was loaded with
+        length: The number of rows
+        read: A function which parses the columns at the given positions
+        cache: A dict of column positions mapped to parsed columns
+        shared: A dict of file column positions mapped to parsed columns,
+            shared by every frame of the same content
+        derived: A dict of derived column positions mapped to their
+            Expression and the positions of the columns it names
+        line_index: The LineIndex of the file, if it was built
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        length: int,
+        read: Callable[[List[int]], List[Column]],
+        shared: Optional[Dict[int, Column]] = None,
+        line_index: Optional[LineIndex] = None,
+    ):
+        super().__init__(columns, length)
+        self.header = tuple(columns)
+        self.read = read
+        self.cache: Dict[int, Column] = {}
+        self.shared: Dict[int, Column] = {} if shared is None else shared
+        self.derived: Dict[int, Tuple[Expression, Dict[str, int]]] = {}
+        self.line_index = line_index
+
+    def share(self) -> "LazyFrame":
+        """Makes another frame of the same content.
+
+        File columns are parsed once for both frames and their read-only
+        arrays are shared. Renames and derived columns only change the frame
+        they are made in, so the new frame starts from the file's header.
+        """
+        return LazyFrame(
+            self.header, self.length, self.read, self.shared, self.line_index
+        )
+
+    def prefetch(self, names: Iterable[str]) -> None:
+        self.fetch({self.position(name) for name in names})
+
+    def fetch(self, positions: Set[int]) -> None:
+        positions = positions - self.cache.keys()
+        derived = positions & self.derived.keys()
+        # Read the inputs of derived columns in the same pass as the rest
+        inputs = {
+            position
+            for derived_position in derived
+            for position in self.derived[derived_position][1].values()
+        }
+        wanted = (positions | inputs) - self.derived.keys() - self.cache.keys()
+        for position in wanted & self.shared.keys():
+            self.cache[position] = self.shared[position]
+        read = sorted(wanted - self.shared.keys())
+        if read:
+            for position, column in zip(read, self.read(read)):
+                self.store(position, column)
+                self.shared[position] = column
+        for position in sorted(derived):
+            self.evaluate(position)
+
+    def store(self, position: int, column: Column) -> None:
+        column.values.setflags(write=False)
+        self.cache[position] = column
+
+    def evaluate(self, position: int) -> None:
+        expression, inputs = self.derived[position]
+        self.fetch(set(inputs.values()))
+        columns = {name: self.cache[i].numeric for name, i in inputs.items()}
+        self.store(position, Column(expression.evaluate(columns, self.length)))
+
+    def dependents(self, position: int) -> Set[int]:
+        """Finds the derived columns computed from a column, directly or not."""
+        found: Set[int] = set()
+        pending = [position]
+        while pending:
+            current = pending.pop()
+            for derived_position, (_, inputs) in self.derived.items():
+                if current in inputs.values() and derived_position not in found:
+                    found.add(derived_position)
+                    pending.append(derived_position)
+        return found
+
+    def invalidate(self, position: int) -> None:
+        """Drops a changed column and the derived columns computed from it."""
+        for stale in {position} | self.dependents(position):
+            self.cache.pop(stale, None)
+
+    def define(self, name: str, expression: Expression) -> int:
+        """Adds a derived column, or replaces the expression of one.
+
+        The column is evaluated the first time it is used.
+
+        Returns:
+            The position of the column
+        """
+        inputs = {}
+        for col in expression.columns:
+            if col not in self._columns:
+                raise ExpressionError(f"No such column {col}")
+            inputs[col] = self.position(col)
+        if name in self._columns:
+            position = self.position(name)
+            if position not in self.derived:
+                raise ExpressionError(f"Column {name} is read from the file")
+            used = set(inputs.values())
+            if position in used.union(*(self.ancestors(i) for i in used)):
+                raise ExpressionError(f"Column {name} depends on itself")
+            self.invalidate(position)
+        else:
+            position = len(self._columns)
+            self._columns = self._columns.append(Index([name]))
+        self.derived[position] = (expression, inputs)
+        return position
+
+    def ancestors(self, position: int) -> Set[int]:
+        """Finds the columns a derived column is computed from."""
+        found: Set[int] = set()
+        pending = [position]
+        while pending:
+            current = pending.pop()
+            if current in self.derived:
+                for i in self.derived[current][1].values():
+                    if i not in found:
+                        found.add(i)
+                        pending.append(i)
+        return found
+
+    def is_derived(self, name: str) -> bool:
+        return self.position(name) in self.derived
+
+    def is_parsed(self, name: str) -> bool:
+        return self.position(name) in self.cache
+
+    def column(self, name: str) -> Column:
+        self.prefetch([name])
+        return self.cache[self.position(name)]
+
+    def __getitem__(self, name: str) -> Series:
+        return self.column(name).series(name)
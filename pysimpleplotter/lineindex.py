@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+from array import array
+from dataclasses import dataclass
+from itertools import islice
+from mmap import ACCESS_READ, mmap
+from typing import BinaryIO, Iterator, List, Optional, Sequence
+
+from numpy import (
+    concatenate,
+    flatnonzero,
+    frombuffer,
+    int64,
+    ndarray,
+    searchsorted,
+    uint8,
+)
+
+from pysimpleplotter.dialect import Dialect
+
+
+# Every STRIDE-th line start is stored, so 40 million lines take 5 MB
+STRIDE = 64
+READ_SIZE = 1 << 16
+
+
+def read_lines(file: BinaryIO, terminator: str = "\n") -> Iterator[bytes]:
+    """Iterates over the lines of a binary file, keeping their terminators."""
+    if terminator == "\n":
+        return iter(file)
+    return split_lines(file, terminator.encode())
+
+
+def split_lines(file: BinaryIO, end: bytes) -> Iterator[bytes]:
+    rest = b""
+    while True:
+        chunk = file.read(READ_SIZE)
+        lines = (rest + chunk).split(end)
+        rest = lines.pop()
+        for line in lines:
+            yield line + end
+        if not chunk:
+            break
+    if rest:
+        yield rest
+
+
+class LineIndexBuilder:
+    """Collects line offsets during the loading pass.
+
+    Attributes:
+        terminator: The character lines end with
+        offsets: The byte offsets of every STRIDE-th line
+        offset: The byte offset of the next line
+        line_count: The number of lines added
+    """
+
+    def __init__(self, terminator: str = "\n"):
+        self.terminator = terminator
+        self.offsets = array("q")
+        self.offset = 0
+        self.line_count = 0
+
+    def add_block(self, block: bytes) -> None:
+        """Adds a block of lines which all end with a terminator but the last."""
+        if not block:
+            return
+        buffer = frombuffer(block, uint8)
+        starts = flatnonzero(buffer == ord(self.terminator)) + 1
+        if len(starts) and starts[-1] == len(block):
+            starts = starts[:-1]
+        starts = concatenate(([0], starts)) + self.offset
+        first = -self.line_count % STRIDE
+        self.offsets.frombytes(starts[first::STRIDE].astype(int64).tobytes())
+        self.offset += len(block)
+        self.line_count += len(starts)
+
+    def build(
+        self,
+        skipped: Sequence[int],
+        header: Optional[int],
+        dialect: Dialect,
+        col_count: int,
+    ) -> "LineIndex":
+        return LineIndex(
+            frombuffer(self.offsets, dtype=int64),
+            self.line_count,
+            frombuffer(array("q", skipped), dtype=int64),
+            header,
+            dialect,
+            col_count,
+        )
+
+
+@dataclass(frozen=True)
+class LineIndex:
+    """Where the lines of a file start and which ones were not loaded.
+
+    Attributes:
+        offsets: The byte offsets of every STRIDE-th line
+        line_count: The number of lines in the file
+        skipped: The sorted numbers of the lines which are not data rows
+        header: The number of the header line, or None
+        dialect: The Dialect the lines were split with
+        col_count: The number of fields in a data row
+    """
+
+    offsets: ndarray
+    line_count: int
+    skipped: ndarray
+    header: Optional[int]
+    dialect: Dialect
+    col_count: int
+
+    def is_skipped(self, line: int) -> bool:
+        i = searchsorted(self.skipped, line)
+        return bool(i < len(self.skipped) and self.skipped[i] == line)
+
+    def next_skipped(self, line: int) -> Optional[int]:
+        """Finds the first skipped line after a line."""
+        i = searchsorted(self.skipped, line, side="right")
+        return int(self.skipped[i]) if i < len(self.skipped) else None
+
+    def previous_skipped(self, line: int) -> Optional[int]:
+        """Finds the last skipped line before a line."""
+        i = searchsorted(self.skipped, line)
+        return int(self.skipped[i - 1]) if i > 0 else None
+
+    def read(self, file: BinaryIO, start: int, count: int) -> List[bytes]:
+        """Reads count lines from line number start of a seekable file."""
+        start = max(0, min(start, self.line_count))
+        block, skip = divmod(start, STRIDE)
+        if block >= len(self.offsets):
+            return []
+        file.seek(int(self.offsets[block]))
+        lines = read_lines(file, self.dialect.terminator)
+        return list(islice(lines, skip, skip + count))
+
+    def read_mapped(self, file_name: str, start: int, count: int) -> List[bytes]:
+        """Reads count lines from line number start through a memory map.
+
+        Only the pages holding the lines are read, however big the file is.
+        """
+        with open(file_name, "rb") as file, mmap(
+            file.fileno(), 0, access=ACCESS_READ
+        ) as mapped:
+            start = max(0, min(start, self.line_count))
+            block, skip = divmod(start, STRIDE)
+            if block >= len(self.offsets):
+                return []
+            lines = []
+            position = int(self.offsets[block])
+            terminator = self.dialect.terminator.encode()
+            for line in range(skip + count):
+                if position >= len(mapped):
+                    break
+                end = mapped.find(terminator, position)
+                end = len(mapped) if end < 0 else end + 1
+                if line >= skip:
+                    lines.append(mapped[position:end])
+                position = end
+            return lines
+
+    def reason(self, line: int, text: str) -> str:
+        """Explains why a line was skipped, or an empty string if it was not."""
+        if line == self.header:
+            return "header"
+        if not self.is_skipped(line):
+            return ""
+        if not text.strip():
+            return "blank"
+        return f"{self.dialect.count(text)} fields, expected {self.col_count}"
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+
+import sys
+from dataclasses import dataclass
+from io import BytesIO
+from socket import AF_UNIX, SHUT_RDWR, SOCK_STREAM, create_connection, socket
+from threading import Event, Lock, Thread
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from numpy import (
+    arange,
+    concatenate,
+    empty,
+    flatnonzero,
+    float64,
+    frombuffer,
+    int64,
+    ndarray,
+    uint8,
+)
+from pandas import Series
+
+from pysimpleplotter.column import Column, ColumnType
+from pysimpleplotter.dataset import ENCODING, READ_SIZE
+from pysimpleplotter.dialect import (
+    Dialect,
+    NumericLocale,
+    infer_types,
+    is_header,
+    sniff,
+)
+from pysimpleplotter.exceptions import ExpressionError, UnknownFileTypeError
+from pysimpleplotter.expression import Expression
+from pysimpleplotter.frame import Table
+
+
+# Rows kept per source, 8 MB per column
+CAPACITY = 1 << 20
+# Lines waited for before the dialect and columns are guessed, fewer than
+# the sample of a file since a slow stream could take long to send them
+STREAM_SAMPLE_LINES = 8
+# A line longer than this is dropped rather than buffered
+MAX_LINE_BYTES = 1 << 20
+SAMPLE_COLUMN = "sample"
+
+
+def stored_type(kind: ColumnType) -> type:
+    """Datetimes are kept as int64 epoch nanoseconds, other fields as float64."""
+    return int64 if kind == ColumnType.DATETIME else float64
+
+
+class RingBuffer:
+    """The newest rows of a stream, in columns allocated once.
+
+    Attributes:
+        values: A list of a capacity long array for each column, which the
+            rows are written to
+        count: The number of rows appended, including overwritten ones
+    """
+
+    def __init__(self, dtypes: Sequence[type], capacity: int = CAPACITY):
+        self.values = [empty(capacity, dtype=dtype) for dtype in dtypes]
+        self.count = 0
+        self.lock = Lock()
+
+    @property
+    def capacity(self) -> int:
+        return len(self.values[0])
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def append(self, columns: Sequence[ndarray]) -> None:
+        """Writes a block of rows, as a sequence of columns, over the oldest."""
+        appended = len(columns[0])
+        kept = min(appended, self.capacity)
+        with self.lock:
+            start = (self.count + appended - kept) % self.capacity
+            first = min(kept, self.capacity - start)
+            for values, column in zip(self.values, columns):
+                column = column[appended - kept :]
+                values[start : start + first] = column[:first]
+                values[: kept - first] = column[first:]
+            self.count += appended
+
+    def snapshot(self) -> Tuple[int, List[ndarray]]:
+        """Copies the rows out, oldest first.
+
+        Returns:
+            The count when the copy was made, and the columns of the rows
+        """
+        return self.since(0)
+
+    def since(self, count: int) -> Tuple[int, List[ndarray]]:
+        """Copies out the rows appended after the first count, oldest first.
+
+        Rows which have been overwritten are left out.
+
+        Returns:
+            The count when the copy was made, and the columns of the rows
+        """
+        with self.lock:
+            new = min(self.count - count, self.capacity)
+            start = (self.count - new) % self.capacity
+            end = start + new
+            if end <= self.capacity:
+                return self.count, [values[start:end].copy() for values in self.values]
+            return self.count, [
+                concatenate((values[start:], values[: end - self.capacity]))
+                for values in self.values
+            ]
+
+
+def parse_block(
+    block: bytes, dialect: Dialect, types: Sequence[ColumnType]
+) -> Tuple[List[ndarray], int]:
+    """Parses the lines of a block ending with a newline into columns.
+
+    Lines are counted and parsed in bulk. Datetimes become int64 epoch
+    nanoseconds, and other fields float64, with NaN for those which are not
+    numbers.
+
+    Returns:
+        A list of the columns of the rows, and the number of lines skipped
+            for having the wrong number of fields
+    """
+    counts = dialect.count_lines(block)
+    matching = counts == len(types)
+    skipped = len(counts) - int(matching.sum())
+    if skipped:
+        buffer = frombuffer(block, uint8)
+        ends = flatnonzero(buffer == ord("\n")) + 1
+        starts = concatenate(([0], ends[:-1]))
+        block = b"".join(block[starts[i] : ends[i]] for i in flatnonzero(matching))
+    if not block:
+        return [empty(0, dtype=stored_type(kind)) for kind in types], skipped
+    # Codes of categories would differ from block to block
+    types = [
+        ColumnType.FLOAT if kind == ColumnType.CATEGORY else kind for kind in types
+    ]
+    columns = dialect.read(BytesIO(block), types, range(len(types)), (), ENCODING)
+    return [
+        column.values if kind == ColumnType.DATETIME else column.numeric
+        for column, kind in zip(columns, types)
+    ], skipped
+
+
+@dataclass(frozen=True)
+class LiveSource:
+    """A stream of delimited records, and how to read it.
+
+    Attributes:
+        name: The name shown for the dataset
+        address: "-" for stdin, "tcp:host:port", "unix:path", or the path of
+            a named pipe
+        locale: The NumericLocale of the numbers, or None to sniff it
+        capacity: The number of rows kept
+        units: Whether a sniffed locale has a units suffix even if none is seen
+    """
+
+    name: str
+    address: str
+    locale: Optional[NumericLocale] = None
+    capacity: int = CAPACITY
+    units: bool = False
+
+    def open(self) -> Tuple[BinaryIO, Optional[socket]]:
+        """Connects to the stream.
+
+        Returns:
+            The binary stream, and its socket if it is one
+        """
+        if self.address == "-":
+            return sys.stdin.buffer, None
+        scheme, _, rest = self.address.partition(":")
+        if scheme == "tcp":
+            host, _, port = rest.rpartition(":")
+            connection = create_connection((host, int(port)))
+        elif scheme == "unix":
+            connection = socket(AF_UNIX, SOCK_STREAM)
+            connection.connect(rest)
+        else:
+            # Opening a named pipe waits for the producer to open it too
+            return open(self.address, "rb"), None
+        return connection.makefile("rb"), connection
+
+    def connect(self) -> "LiveFrame":
+        """Reads the first lines to find the columns, then streams the rest.
+
+        Blocks until STREAM_SAMPLE_LINES lines have arrived or the stream ends. The
+        rows are then read on a background thread until the stream ends or the
+        frame is stopped.
+        """
+        stream, connection = self.open()
+        data = b""
+        while data.count(b"\n") < STREAM_SAMPLE_LINES:
+            chunk = stream.read1(READ_SIZE)
+            if not chunk:
+                break
+            data += chunk
+        end = data.rfind(b"\n") + 1
+        sample = [line.decode(ENCODING) for line in data[:end].split(b"\n")[:-1]]
+        lines = [line for line in sample if line.strip()]
+        dialect = sniff(lines, self.locale, self.units)
+        col_count = dialect.count(lines[-1]) if lines else 0
+        if col_count == 0:
+            raise UnknownFileTypeError(f"No data found in {self.address}")
+        first = next(
+            i for i, line in enumerate(sample) if dialect.count(line) == col_count
+        )
+        rows = [dialect.split(line) for line in sample[first:]]
+        types = infer_types(
+            [values for values in rows if len(values) == col_count], dialect.locale
+        )
+        cols = [f"col{i+1}" for i in range(col_count)]
+        if is_header(rows[0], types, dialect.locale):
+            cols = rows[0]
+            # Lines before the header have the wrong field count anyway
+            data = data[sum(len(line) + 1 for line in sample[: first + 1]) :]
+        dtypes = [*map(stored_type, types), float64]
+        frame = LiveFrame(
+            [*cols, SAMPLE_COLUMN], types, RingBuffer(dtypes, self.capacity)
+        )
+        frame.connection = connection
+        # Parse the sampled lines here so a new frame is never empty
+        end = data.rfind(b"\n") + 1
+        frame.parse(data[:end], dialect)
+        frame.reader = Thread(
+            target=frame.stream,
+            args=(stream, dialect, data[end:]),
+            name=f"LiveSource {self.name}",
+            daemon=True,
+        )
+        frame.reader.start()
+        return frame
+
+
+class LiveFrame(Table):
+    """A table of the newest rows of a LiveSource.
+
+    Supports the parts of the LazyFrame interface the plotter uses. The
+    columns hold the rows copied out at the last refresh, so they don't
+    change while a plot is drawn from them. The last column numbers the rows
+    in the order they arrived.
+
+    Attributes:
+        types: The ColumnTypes of the stream's fields
+        buffer: The RingBuffer the rows are streamed into
+        rows: A list of a 2 capacity long array for each column, which the
+            refreshed rows are copied to and the columns are views of
+        end: The position after the newest row in rows
+        length: The number of rows at the last refresh
+        count: The number of rows ever streamed at the last refresh
+        cache: A dict of column positions mapped to the refreshed columns
+        skipped: The number of lines skipped for having the wrong number of
+            fields
+        error: The exception which stopped the stream, or None
+        stopped: An Event set to stop reading
+        connection: The socket of the stream, or None
+        reader: The Thread reading the stream
+        line_index: Always None, since the lines are not kept
+    """
+
+    def __init__(
+        self, columns: Sequence[str], types: Sequence[ColumnType], buffer: RingBuffer
+    ):
+        super().__init__(columns, 0)
+        self.types = list(types)
+        self.buffer = buffer
+        self.rows = [
+            empty(2 * buffer.capacity, dtype=values.dtype) for values in buffer.values
+        ]
+        self.end = 0
+        self.count = 0
+        self.cache: Dict[int, Column] = {}
+        self.skipped = 0
+        self.error: Optional[Exception] = None
+        self.stopped = Event()
+        self.connection: Optional[socket] = None
+        self.reader: Optional[Thread] = None
+        self.line_index = None
+
+    def stream(self, stream: BinaryIO, dialect: Dialect, data: bytes) -> None:
+        """Parses whole lines into the buffer until the stream ends."""
+        try:
+            while True:
+                end = data.rfind(b"\n") + 1
+                if end:
+                    self.parse(data[:end], dialect)
+                    data = data[end:]
+                elif len(data) > MAX_LINE_BYTES:
+                    data = b""
+                    self.skipped += 1
+                chunk = b"" if self.stopped.is_set() else stream.read1(READ_SIZE)
+                if not chunk:
+                    break
+                data += chunk
+            # The last line may not end with a newline
+            if data and not self.stopped.is_set():
+                self.parse(data + b"\n", dialect)
+        except (OSError, ValueError) as e:
+            if not self.stopped.is_set():
+                self.error = e
+        finally:
+            stream.close()
+            if self.connection is not None:
+                self.connection.close()
+
+    def parse(self, block: bytes, dialect: Dialect) -> None:
+        rows, skipped = parse_block(block, dialect, self.types)
+        self.skipped += skipped
+        self.append(rows)
+
+    def append(self, columns: Sequence[ndarray]) -> None:
+        start = self.buffer.count
+        sample = arange(start, start + len(columns[0]), dtype=float64)
+        self.buffer.append([*columns, sample])
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.connection is not None:
+            # Wakes the reader from a blocking receive
+            try:
+                self.connection.shutdown(SHUT_RDWR)
+            except OSError:
+                pass
+
+    def refresh(self) -> bool:
+        """Copies out the rows streamed since the last refresh.
+
+        Returns:
+            Whether there were any
+        """
+        if self.buffer.count == self.count:
+            return False
+        self.count, columns = self.buffer.since(self.count)
+        self.store(columns)
+        self.cache = {}
+        for position, kind in enumerate([*self.types, ColumnType.FLOAT]):
+            column = self.rows[position][self.end - self.length : self.end]
+            if kind != ColumnType.DATETIME:
+                kind = ColumnType.FLOAT
+            column.setflags(write=False)
+            self.cache[position] = Column(column, kind)
+        return True
+
+    def store(self, columns: Sequence[ndarray]) -> None:
+        """Adds rows after the refreshed ones, never writing to rows in use.
+
+        Once rows is full, the rows kept are moved to new arrays, so the
+        columns handed out before stay as they were.
+        """
+        added = len(columns[0])
+        if self.end + added > len(self.rows[0]):
+            kept = min(self.length, self.buffer.capacity - added)
+            moved = [empty(len(values), dtype=values.dtype) for values in self.rows]
+            for values, old in zip(moved, self.rows):
+                values[:kept] = old[self.end - kept : self.end]
+            self.rows = moved
+            self.end = kept
+        for values, column in zip(self.rows, columns):
+            values[self.end : self.end + added] = column
+        self.end += added
+        self.length = min(self.length + added, self.buffer.capacity)
+
+    def prefetch(self, names: Iterable[str]) -> None:
+        if not self.cache:
+            self.refresh()
+
+    def define(self, name: str, expression: Expression) -> int:
+        raise ExpressionError("Live sources have no derived columns")
+
+    def is_derived(self, name: str) -> bool:
+        return False
+
+    def is_parsed(self, name: str) -> bool:
+        return True
+
+    def column(self, name: str) -> Column:
+        position = self.position(name)
+        if position not in self.cache:
+            self.refresh()
+        if position not in self.cache:
+            return Column(empty(0, dtype=float64))
+        return self.cache[position]
+
+    def __getitem__(self, name: str) -> Series:
+        return self.column(name).series(name)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Tuple, Union
+
+from numpy import (
+    absolute,
+    arange,
+    concatenate,
+    convolve,
+    cumsum,
+    diff,
+    errstate,
+    flatnonzero,
+    float64,
+    full,
+    gradient,
+    interp,
+    isfinite,
+    isnan,
+    minimum,
+    nan,
+    nanmax,
+    nanmin,
+    nansum,
+    ndarray,
+    where,
+    zeros,
+)
+from numpy.linalg import pinv
+from numpy.polynomial import Polynomial
+from scipy.linalg import solveh_banded
+
+from pysimpleplotter.column import limits
+from pysimpleplotter.exceptions import ProcessingError
+
+
+CACHE_SIZE = 64
+
+
+def odd_window(window: int, size: int) -> int:
+    window = min(window, size if size % 2 else size - 1)
+    return max(window - 1 + window % 2, 1)
+
+
+def moving_average(y: ndarray, window: int) -> ndarray:
+    """Averages the values around each point, skipping missing ones.
+
+    A window with no values is NaN.
+    """
+    half = odd_window(window, len(y)) // 2
+    missing = isnan(y)
+    sums = concatenate(([0.0], cumsum(where(missing, 0.0, y))))
+    counts = concatenate(([0], cumsum(~missing)))
+    index = arange(len(y))
+    start = (index - half).clip(0, len(y))
+    stop = (index + half + 1).clip(0, len(y))
+    # Windows shrink at the edges instead of padding with zeros
+    with errstate(invalid="ignore"):
+        return (sums[stop] - sums[start]) / (counts[stop] - counts[start])
+
+
+def savitzky_golay(y: ndarray, window: int, order: int) -> ndarray:
+    """Fits a polynomial to the values around each point.
+
+    Missing points are interpolated from their neighbours before fitting,
+    and a window with no values is NaN, as for the moving average.
+    """
+    window = odd_window(window, len(y))
+    order = min(order, window - 1)
+    half = window // 2
+    if half == 0:
+        return y.copy()
+    missing = isnan(y)
+    if missing.all():
+        return y.copy()
+    if missing.any():
+        present = flatnonzero(~missing)
+        y = interp(arange(len(y)), present, y[present])
+    positions = arange(-half, half + 1, dtype=float64)
+    vandermonde = positions[:, None] ** arange(order + 1)
+    fit = pinv(vandermonde)
+    smoothed = convolve(y, fit[0][::-1], mode="same")
+    # Evaluate the fitted polynomial of the first and last windows at the edges
+    smoothed[:half] = (vandermonde @ (fit @ y[:window]))[:half]
+    smoothed[-half:] = (vandermonde @ (fit @ y[-window:]))[-half:]
+    if missing.any():
+        empty = moving_average(where(missing, nan, 0.0), window)
+        smoothed[isnan(empty)] = nan
+    return smoothed
+
+
+def als_baseline(y: ndarray, lam: float, p: float, iterations: int) -> ndarray:
+    """Asymmetric least squares baseline (Eilers and Boelens, 2005).
+
+    Missing points get zero weight, so the baseline bridges them.
+    """
+    n = len(y)
+    if n < 3:
+        return y.copy()
+    # Upper bands of lam * D^T D for the second difference matrix D, in
+    # the layout solveh_banded takes
+    bands = zeros((3, n))
+    bands[0, 2:] = lam
+    bands[1, 1:] = -4.0 * lam
+    bands[1, [1, -1]] = -2.0 * lam
+    bands[2] = 6.0 * lam
+    bands[2, [0, -1]] = lam
+    bands[2, [1, -2]] = 5.0 * lam
+    penalty = bands[2].copy()
+    present = ~isnan(y)
+    known = where(present, y, 0.0)
+    weights = present.astype(float64)
+    baseline = y
+    for _ in range(iterations):
+        bands[2] = penalty + weights
+        baseline = solveh_banded(bands, weights * known, check_finite=False)
+        weights = where(known > baseline, p, 1.0 - p) * present
+    return baseline
+
+
+@dataclass(frozen=True)
+class Smooth:
+    method: str = "Savitzky-Golay"
+    window: int = 11
+    order: int = 3
+
+    def __post_init__(self) -> None:
+        if self.window < 1 or self.order < 0:
+            raise ProcessingError(
+                "Smoothing needs a positive window and a non-negative order"
+            )
+
+    def apply(self, x: ndarray, y: ndarray) -> ndarray:
+        if self.method == "Moving average":
+            return moving_average(y, self.window)
+        if self.method == "Savitzky-Golay":
+            return savitzky_golay(y, self.window, self.order)
+        raise ProcessingError(f"No such smoothing method {self.method}")
+
+
+@dataclass(frozen=True)
+class Baseline:
+    method: str = "Polynomial"
+    degree: int = 2
+    lam: float = 1e5
+    p: float = 0.01
+    iterations: int = 10
+
+    def __post_init__(self) -> None:
+        if self.degree < 0 or self.lam <= 0 or not 0 < self.p < 1:
+            raise ProcessingError(
+                "Baselines need a non-negative degree, positive λ and p in (0, 1)"
+            )
+
+    def apply(self, x: ndarray, y: ndarray) -> ndarray:
+        if self.method == "Polynomial":
+            # Iteratively clip peaks so the fit follows the lower envelope
+            finite = isfinite(x) & isfinite(y)
+            if not finite.any():
+                return y.copy()  # Nothing to fit a baseline to
+            envelope = y[finite]
+            for _ in range(self.iterations):
+                fit = Polynomial.fit(x[finite], envelope, self.degree)
+                envelope = minimum(y[finite], fit(x[finite]))
+            return y - fit(x)
+        if self.method == "Asymmetric least squares":
+            return y - als_baseline(y, self.lam, self.p, self.iterations)
+        raise ProcessingError(f"No such baseline method {self.method}")
+
+
+@dataclass(frozen=True)
+class Normalize:
+    method: str = "Maximum"
+
+    def apply(self, x: ndarray, y: ndarray) -> ndarray:
+        if self.method == "Maximum":
+            return y / nanmax(absolute(y))
+        if self.method == "Area":
+            return y / absolute(nansum((y[1:] + y[:-1]) / 2 * diff(x)))
+        if self.method == "Min-max":
+            low = nanmin(y)
+            return (y - low) / (nanmax(y) - low)
+        raise ProcessingError(f"No such normalization method {self.method}")
+
+
+@dataclass(frozen=True)
+class Derivative:
+    order: int = 1
+
+    def apply(self, x: ndarray, y: ndarray) -> ndarray:
+        if len(y) < 2:
+            return full(len(y), nan)
+        for _ in range(self.order):
+            y = gradient(y, x)
+        return y
+
+
+Stage = Union[Smooth, Baseline, Normalize, Derivative]
+
+
+class Pipeline:
+    """Runs processing stages with every intermediate result memoized.
+
+    Results are keyed by an input version and the stages up to and including
+    the one that produced them, so changing a parameter only reruns that stage
+    and the ones after it.
+
+    Attributes:
+        cache: An OrderedDict of (version, stages) mapped to stage outputs in
+            least recently used order
+        size: The number of outputs to keep
+        output_limits: A dict of cache keys mapped to the lowest and highest
+            value of the output
+    """
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.cache: Dict[Tuple[Hashable, Tuple[Stage, ...]], ndarray] = OrderedDict()
+        self.size = size
+        self.output_limits: Dict[Tuple[Hashable, Tuple[Stage, ...]], Tuple] = {}
+
+    def run(
+        self, version: Hashable, x: ndarray, y: ndarray, stages: Tuple[Stage, ...]
+    ) -> ndarray:
+        start = 0
+        for i in range(len(stages), 0, -1):
+            key = (version, stages[:i])
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                y = self.cache[key]
+                start = i
+                break
+        for i in range(start, len(stages)):
+            # There is nothing to process in an empty series
+            y = stages[i].apply(x, y) if len(y) else y.copy()
+            y.setflags(write=False)
+            self.cache[(version, stages[: i + 1])] = y
+            if len(self.cache) > self.size:
+                key, _ = self.cache.popitem(last=False)
+                self.output_limits.pop(key, None)
+        return y
+
+    def evict(self, stale: Callable[[Hashable], bool]) -> None:
+        """Drops the outputs of every input version stale returns True for."""
+        for key in [key for key in self.cache if stale(key[0])]:
+            del self.cache[key]
+            self.output_limits.pop(key, None)
+
+    def limits(
+        self, version: Hashable, x: ndarray, y: ndarray, stages: Tuple[Stage, ...]
+    ) -> Tuple[float, float]:
+        """Finds the lowest and highest processed value, scanning it only once."""
+        if not stages:
+            return limits(y)
+        key = (version, stages)
+        if key not in self.output_limits:
+            self.output_limits[key] = limits(self.run(version, x, y, stages))
+        return self.output_limits[key]
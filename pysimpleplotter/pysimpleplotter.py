@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
 
 import dataclasses
+from concurrent.futures import ThreadPoolExecutor, wait
 from enum import Enum
+from functools import partial
+from itertools import count
+from math import isnan
+from os import cpu_count
 from os.path import split, splitext, getsize
-from typing import List, Dict, Any
+from queue import Queue
+from threading import Thread
+from time import monotonic
+from tkinter import Event, PhotoImage
+from typing import List, Dict, Any, Hashable, Optional, Set, Tuple, Union
 
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from pandas import DataFrame
+from numpy import ndarray
+from pandas import Timestamp, isna
 from PySimpleGUI import (
     DEFAULT_ELEMENT_SIZE,
+    TIMEOUT_EVENT,
     WIN_CLOSED,
     RELIEF_SUNKEN,
     Canvas,
@@ -25,16 +34,104 @@ from PySimpleGUI import (
     Combo,
     FilesBrowse,
     Listbox,
+    Multiline,
+    ProgressBar,
+    popup_error,
     popup_get_file,
+    popup_get_text,
 )
 
+from pysimpleplotter.column import ColumnType
+from pysimpleplotter.compression import EXTENSIONS, Compression, detect, members, span
 from pysimpleplotter.guiconfig import GuiConfig
 from pysimpleplotter.dataset import Dataset
+from pysimpleplotter.dialect import NumericLocale
+from pysimpleplotter.exceptions import (
+    ExpressionError,
+    ProcessingError,
+    UnknownFileTypeError,
+)
+from pysimpleplotter.expression import parse_definition
+from pysimpleplotter.frame import LazyFrame
+from pysimpleplotter.live import LiveFrame, LiveSource
+from pysimpleplotter.processing import (
+    Baseline,
+    Derivative,
+    Normalize,
+    Pipeline,
+    Smooth,
+    Stage,
+)
 from pysimpleplotter.relation import Relation
+from pysimpleplotter.renderer import (
+    STYLES,
+    GridSpec,
+    Panel,
+    PlotSpec,
+    Rendering,
+    RenderWorker,
+    Spec,
+    Trace,
+)
+from pysimpleplotter.roi import RoiIndex
 
 
 Layout = List[List[Element]]
 
+CANVAS_SIZE = (640, 480)
+
+LAYOUTS = ("Single", "Grid by relation", "Grid by dataset")
+
+# Seconds between progress bar updates while datasets load
+PROGRESS_INTERVAL = 0.1
+
+# Most live plot frames drawn a second
+FRAME_RATE = 25
+
+PREVIEW_LINES = 12
+# Lines shown above the line jumped to
+PREVIEW_CONTEXT = 3
+
+NUMBER_FORMATS = {
+    "Auto": None,
+    "1234.5": NumericLocale(".", ""),
+    "1,234.5": NumericLocale(".", ","),
+    "1234,5": NumericLocale(",", ""),
+    "1.234,5": NumericLocale(",", "."),
+    "1'234.5": NumericLocale(".", "'"),
+}
+
+PROCESSING_KEYS = (
+    "-SMOOTHING-",
+    "-SMOOTHING_WINDOW-",
+    "-SMOOTHING_ORDER-",
+    "-BASELINE-",
+    "-BASELINE_DEGREE-",
+    "-BASELINE_LAMBDA-",
+    "-BASELINE_P-",
+    "-NORMALIZE-",
+    "-DERIVATIVE-",
+)
+
+# Plot edits which only redraw text over the cached data layer
+DECORATION_KEYS = (
+    "-PLOT_TITLE-",
+    "-X_AXIS_LABEL-",
+    "-X_AXIS_UNITS-",
+    "-Y_AXIS_LABEL-",
+    "-Y_AXIS_UNITS-",
+    "-LEGEND-",
+)
+
+# Edits which redraw the plot once one is shown
+REPLOT_EVENTS = (
+    "-SELECT_INDEPENDENT_COL-",
+    "-SELECT_DEPENDENT_COL-",
+    "-SELECT_COLOR-",
+    *PROCESSING_KEYS,
+    *DECORATION_KEYS,
+)
+
 
 def human_readable(byte_count: int, _format: str = "{value:.3f} {symbol}") -> str:
     symbols = ("B", "K", "M", "G", "T", "P", "E", "Z", "Y")
@@ -48,6 +145,16 @@ def human_readable(byte_count: int, _format: str = "{value:.3f} {symbol}") -> st
     return _format.format(value=byte_count, symbol=symbols[0])
 
 
+def shared_limits(
+    limits: List[Tuple[float, float]]
+) -> Optional[Tuple[float, float]]:
+    lows = [low for low, _ in limits if not isnan(low)]
+    highs = [high for _, high in limits if not isnan(high)]
+    if not lows:
+        return None
+    return min(lows), max(highs)
+
+
 class PySimplePlotter:
     """Plots simple delimited data.
 
@@ -56,9 +163,25 @@ class PySimplePlotter:
 
     Attributes:
         gui_config: A GuiConfig defining how the window should look
-        datasets: A dict of names mapped to Datasets defining the files for dfs
-        dfs: A dict of names mapped of DataFrames for the plotting data
+        datasets: A dict of names mapped to Datasets defining the files for dfs,
+            or LiveSources defining the streams
+        dfs: A dict of names mapped to LazyFrames for the plotting data, or
+            LiveFrames for the newest rows of streams
+        fingerprints: A dict of dataset content fingerprints mapped to the
+            LazyFrame every dataset with that content shares columns with
         relations: A dict of names mapped to variable relations to plot
+        roi_indexes: A dict of relation names mapped to the relation and the
+            RoiIndex built from its columns
+        pipeline: A Pipeline which memoizes the processed relation columns
+        versions: A dict of dataset names mapped to the version of their data
+        renderer: A RenderWorker which draws plots off the GUI thread
+        delivered: A Queue of the Renderings and render errors handed over by
+            the renderer, one for each -RENDERED- event
+        spec: The PlotSpec of the last plot requested
+        rendering: The Rendering shown on the canvas
+        preview_line: The number of the line jumped to in the preview
+        next_frame: The monotonic time the next live plot frame is due
+        reported: A set of the LiveFrames whose stream error was shown
         window: A Window which displays and stores user input
     """
 
@@ -70,20 +193,41 @@ class PySimplePlotter:
             valign="top",
             frame_size=(64, 1),
         )
-        self.datasets: Dict[str, Dataset] = {}
-        self.dfs: Dict[str, DataFrame] = {}
+        self.datasets: Dict[str, Union[Dataset, LiveSource]] = {}
+        self.dfs: Dict[str, Union[LazyFrame, LiveFrame]] = {}
+        self.fingerprints: Dict[Hashable, LazyFrame] = {}
         self.relations: Dict[str, Relation] = {}
+        self.roi_indexes: Dict[str, Tuple[Relation, RoiIndex]] = {}
+        self.pipeline = Pipeline()
+        self.versions: Dict[str, int] = {}
+        self.version_counter = count()
         self.window: Window = None
-        self.fig: Figure = None
-        self.ax: Axes = None
+        self.renderer = RenderWorker(self.deliver_rendering)
+        self.delivered: Queue = Queue()
+        self.spec: Optional[PlotSpec] = None
+        self.rendering: Optional[Rendering] = None
+        self.photo: Optional[PhotoImage] = None
+        self.canvas_image: Optional[int] = None
+        self.roi_span: Optional[int] = None
+        self.roi_anchor: Optional[float] = None
+        self.preview_line = 0
+        self.next_frame = 0.0
+        self.reported: Set[LiveFrame] = set()
 
     def gui(self) -> None:
         self.initialize_window()
+        self.renderer.start()
         while True:
-            event, values = self.window.read()
+            event, values = self.window.read(timeout=self.frame_timeout())
             if event == WIN_CLOSED or event == "Exit":
                 break
-            self.handle(event, values)
+            if event != TIMEOUT_EVENT:
+                self.handle(event, values)
+            self.animate(values)
+        for df in self.dfs.values():
+            if isinstance(df, LiveFrame):
+                df.stop()
+        self.renderer.stop()
         self.window.close()
 
     def initialize_window(self) -> None:
@@ -117,8 +261,16 @@ class PySimplePlotter:
                     vertical_alignment=self.gui_config.valign,
                 ),
             ],
+            [
+                Frame(
+                    "Preview",
+                    self.preview_layout(),
+                    vertical_alignment=self.gui_config.valign,
+                ),
+            ],
         ]
-        self.window = Window(self.gui_config.window_title, layout)
+        self.window = Window(self.gui_config.window_title, layout, finalize=True)
+        self.bind_canvas()
 
     def datasets_layout(self) -> Layout:
         return [
@@ -135,15 +287,36 @@ class PySimplePlotter:
                         "Open",
                         file_types=(
                             ("Delimiter-separated values", "*.csv *.tsv *.txt"),
+                            ("Compressed files", EXTENSIONS),
                             ("All files", "*"),
                         ),
                     ),
+                    Button("Live", key="-OPEN_LIVE-"),
                     Button("Remove", key="-REMOVE_DATASET-"),
                 ],
                 select_key="-SELECT_DATASET-",
                 rename_key="-RENAME_DATASET-",
                 default_text="No datasets",
             ),
+            [
+                Text("Number format"),
+                Combo(
+                    list(NUMBER_FORMATS),
+                    default_value="Auto",
+                    key="-NUMBER_FORMAT-",
+                    size=(10, 1),
+                    readonly=True,
+                ),
+                Checkbox("Units suffix", key="-UNITS_SUFFIX-"),
+            ],
+            [
+                ProgressBar(
+                    1,
+                    orientation="h",
+                    size=(38, 10),
+                    key="-LOAD_PROGRESS-",
+                ),
+            ],
             *self.display(
                 [
                     "File name:",
@@ -267,8 +440,72 @@ class PySimplePlotter:
                 Input("", key="-SELECT_COLOR-", size=(1, 1), visible=False, enable_events=True),
                 ColorChooserButton("Choose"),
             ],
+            [
+                Text("Smoothing", size=(10, 1)),
+                self.option("-SMOOTHING-", ["None", "Moving average", "Savitzky-Golay"]),
+                Text("Window"),
+                self.parameter("-SMOOTHING_WINDOW-", "11"),
+                Text("Order"),
+                self.parameter("-SMOOTHING_ORDER-", "3"),
+            ],
+            [
+                Text("Baseline", size=(10, 1)),
+                self.option(
+                    "-BASELINE-",
+                    ["None", "Polynomial", "Asymmetric least squares"],
+                ),
+                Text("Degree"),
+                self.parameter("-BASELINE_DEGREE-", "2"),
+                Text("λ"),
+                self.parameter("-BASELINE_LAMBDA-", "1e5"),
+                Text("p"),
+                self.parameter("-BASELINE_P-", "0.01"),
+            ],
+            [
+                Text("Normalize", size=(10, 1)),
+                self.option("-NORMALIZE-", ["None", "Maximum", "Area", "Min-max"]),
+                Text("Derivative"),
+                self.option("-DERIVATIVE-", ["None", "1", "2"], 5),
+            ],
+            [
+                Text("ROI"),
+                Input(key="-ROI_LOW-", size=(12, 1), enable_events=True),
+                Text("to"),
+                Input(key="-ROI_HIGH-", size=(12, 1), enable_events=True),
+            ],
+            *self.display(
+                [
+                    "ROI points:",
+                    "ROI mean:",
+                    "ROI std. dev.:",
+                    "ROI median:",
+                    "ROI minimum:",
+                    "ROI maximum:",
+                ],
+                [
+                    "-ROI_COUNT-",
+                    "-ROI_MEAN-",
+                    "-ROI_STD-",
+                    "-ROI_MEDIAN-",
+                    "-ROI_MIN-",
+                    "-ROI_MAX-",
+                ],
+            ),
         ]
 
+    def option(self, key: str, options: List[str], width: int = 22) -> Combo:
+        return Combo(
+            options,
+            default_value=options[0],
+            enable_events=True,
+            key=key,
+            readonly=True,
+            size=(width, 1),
+        )
+
+    def parameter(self, key: str, default_text: str) -> Input:
+        return Input(default_text, key=key, size=(5, 1), enable_events=True)
+
     def selector(
         self,
         controls: List[Element],
@@ -307,7 +544,7 @@ class PySimplePlotter:
         return [
             [Text("Title")],
             [
-                Input(key="-PLOT_TITLE-"),
+                Input(key="-PLOT_TITLE-", enable_events=True),
             ],
             [
                 Column(
@@ -321,16 +558,16 @@ class PySimplePlotter:
                 Column(
                     [
                         [Text("Label")],
-                        [Input(key="-X_AXIS_LABEL-", size=(25, 1))],
-                        [Input(key="-Y_AXIS_LABEL-", size=(25, 1))],
+                        [Input(key="-X_AXIS_LABEL-", size=(25, 1), enable_events=True)],
+                        [Input(key="-Y_AXIS_LABEL-", size=(25, 1), enable_events=True)],
                     ],
                     pad=(0, 0),
                 ),
                 Column(
                     [
                         [Text("Units")],
-                        [Input(key="-X_AXIS_UNITS-", size=(12, 1))],
-                        [Input(key="-Y_AXIS_UNITS-", size=(12, 1))],
+                        [Input(key="-X_AXIS_UNITS-", size=(12, 1), enable_events=True)],
+                        [Input(key="-Y_AXIS_UNITS-", size=(12, 1), enable_events=True)],
                     ],
                     pad=(0, 0),
                 ),
@@ -341,9 +578,7 @@ class PySimplePlotter:
                         [Text("Style")],
                         [
                             Combo(
-                                [
-                                    "Default",
-                                ],
+                                list(STYLES),
                                 default_value="Default",
                                 key="-STYLE-",
                             )
@@ -358,7 +593,21 @@ class PySimplePlotter:
                     ],
                     pad=(0, 0),
                 ),
-                Checkbox("Include legend", key="-LEGEND-"),
+                Column(
+                    [
+                        [Text("Layout")],
+                        [
+                            Combo(
+                                list(LAYOUTS),
+                                default_value="Single",
+                                key="-LAYOUT-",
+                                readonly=True,
+                            )
+                        ],
+                    ],
+                    pad=(0, 0),
+                ),
+                Checkbox("Include legend", key="-LEGEND-", enable_events=True),
             ],
             [
                 Button("Plot", key="-PLOT-"),
@@ -367,24 +616,50 @@ class PySimplePlotter:
 
     def canvas_layout(self) -> Layout:
         return [
-            [Canvas(size=(640, 480), key="-CANVAS-")],
+            [Canvas(size=CANVAS_SIZE, key="-CANVAS-")],
             [
                 Button("Save", key="-SAVE_PLOT-"),
             ],
         ]
 
+    def preview_layout(self) -> Layout:
+        return [
+            [
+                Text("Line"),
+                Input("1", key="-PREVIEW_LINE-", size=(16, 1)),
+                Button("Go", key="-PREVIEW_GO-"),
+                Button("Previous skipped", key="-PREVIOUS_SKIPPED-"),
+                Button("Next skipped", key="-NEXT_SKIPPED-"),
+                Text("", key="-PREVIEW_STATUS-", size=(40, 1)),
+            ],
+            [
+                Multiline(
+                    "",
+                    size=(160, PREVIEW_LINES),
+                    key="-PREVIEW-",
+                    font=("Courier", 10),
+                    disabled=True,
+                ),
+            ],
+        ]
+
     def handle(self, event: str, values: Dict[Any, Any]) -> None:
         try:
-            print("###################################################")
-            print(event, values)
-
             # Datasets
             if event == "-OPEN_DATASET-":
                 self.open_dataset(values)
+            if event == "-OPEN_LIVE-":
+                self.open_live(values)
             if event == "-SELECT_DATASET-":
                 self.select_dataset(values["-SELECT_DATASET-"][0])
             if event == "-RENAME_DATASET-":
                 self.rename_dataset(values)
+            if event == "-PREVIEW_GO-":
+                self.jump_preview(values)
+            if event == "-NEXT_SKIPPED-":
+                self.next_skipped(values)
+            if event == "-PREVIOUS_SKIPPED-":
+                self.previous_skipped(values)
 
             # Columns
             if event == "-SELECT_COL-":
@@ -394,6 +669,8 @@ class PySimplePlotter:
                 )
             if event == "-RENAME_COL-":
                 self.rename_col(values)
+            if event == "-NEW_COL-":
+                self.new_col(values)
 
             # Relationships
             if event == "-NEW_RELATION-":
@@ -412,8 +689,24 @@ class PySimplePlotter:
                 self.select_dependent_col(values)
             if event == "-SELECT_COLOR-":
                 self.select_color(values)
+            if event in PROCESSING_KEYS:
+                self.select_processing(values)
+            if event in ("-ROI_LOW-", "-ROI_HIGH-"):
+                selected = values["-SELECT_RELATION-"]
+                self.select_roi(selected[0] if selected else None)
             if event == "-PLOT-":
                 self.plot(values)
+            if event in REPLOT_EVENTS and self.spec is not None:
+                self.plot(values)
+            if event == "-LIVE_CONNECTED-":
+                self.add_live(*values["-LIVE_CONNECTED-"])
+            if event == "-RENDERED-":
+                self.show_rendering()
+            if event == "-SAVE_PLOT-":
+                self.save_plot()
+        except UnknownFileTypeError as e:
+            # Columns are parsed when first used, so reading can fail anywhere
+            popup_error(str(e), title="Read error")
         except Exception as e:
             # print(e)
             raise e
@@ -421,14 +714,28 @@ class PySimplePlotter:
     def open_dataset(self, values: Dict[Any, Any]) -> None:
         raw_file_names = values["-OPEN_DATASET-"]
         file_names = raw_file_names.split(";")
-        for index, file_name in enumerate(file_names):
-            name = splitext(split(file_name)[1])[0]
-            self.datasets[name] = Dataset(name, file_name)
-            self.dfs[name] = self.datasets[name].load()
+        locale = self.number_format(values)
+        units = values["-UNITS_SUFFIX-"]
+        try:
+            datasets = [
+                dataset
+                for file_name in file_names
+                for dataset in self.file_datasets(file_name, locale, units)
+            ]
+            dfs = self.load_datasets(datasets)
+        except UnknownFileTypeError as e:
+            popup_error(str(e), title="Open dataset")
+            return
+        for index, (dataset, df) in enumerate(zip(datasets, dfs)):
+            name = dataset.name
+            self.datasets[name] = dataset
+            self.dfs[name] = df
+            self.versions[name] = next(self.version_counter)
             added_index = self.add_list("-SELECT_DATASET-", name)
             if index == 0:
                 first_index = added_index
                 first_name = name
+        self.roi_indexes.clear()
         self.window["-SELECT_DATASET-"].update(set_to_index=first_index)
         self.select_dataset(name)
         self.window["-SELECT_INDEPENDENT_DATASET-"].update(
@@ -438,6 +745,177 @@ class PySimplePlotter:
             values=self.window["-SELECT_DATASET-"].get_list_values(),
         )
 
+    def open_live(self, values: Dict[Any, Any]) -> None:
+        address = popup_get_text(
+            "Stream to read: - for stdin, tcp:host:port, unix:path or a named pipe",
+            title="Live source",
+        )
+        if not address:
+            return
+        name = "stdin" if address == "-" else split(address)[1]
+        source = LiveSource(
+            name, address, self.number_format(values), units=values["-UNITS_SUFFIX-"]
+        )
+        # Sampling waits for the first lines, so the GUI thread must not connect
+        Thread(
+            target=self.connect_live,
+            args=(source,),
+            name=f"Connect {name}",
+            daemon=True,
+        ).start()
+
+    def connect_live(self, source: LiveSource) -> None:
+        try:
+            connected: Union[LiveFrame, Exception] = source.connect()
+        except (OSError, ValueError, UnknownFileTypeError) as e:
+            connected = e
+        self.window.write_event_value("-LIVE_CONNECTED-", (source, connected))
+
+    def add_live(self, source: LiveSource, df: Union[LiveFrame, Exception]) -> None:
+        if isinstance(df, Exception):
+            popup_error(str(df), title="Live source")
+            return
+        name = source.name
+        self.datasets[name] = source
+        self.dfs[name] = df
+        self.versions[name] = next(self.version_counter)
+        index = self.add_list("-SELECT_DATASET-", name)
+        self.window["-SELECT_DATASET-"].update(set_to_index=index)
+        self.select_dataset(name)
+        self.window["-SELECT_INDEPENDENT_DATASET-"].update(
+            values=self.window["-SELECT_DATASET-"].get_list_values(),
+        )
+        self.window["-SELECT_DEPENDENT_DATASET-"].update(
+            values=self.window["-SELECT_DATASET-"].get_list_values(),
+        )
+
+    def frame_timeout(self) -> Optional[int]:
+        """Finds how many milliseconds to wait for events between live frames."""
+        if any(isinstance(df, LiveFrame) for df in self.dfs.values()):
+            return 1000 // FRAME_RATE
+        return None
+
+    def animate(self, values: Dict[Any, Any]) -> None:
+        """Replots when the live datasets of the plot have new rows.
+
+        Frames are drawn at most FRAME_RATE times a second, and the renderer
+        drops the ones it falls behind on.
+        """
+        now = monotonic()
+        if now < self.next_frame:
+            return
+        self.next_frame = now + 1 / FRAME_RATE
+        self.report_live()
+        if self.spec is None:
+            return
+        plotted = {
+            name
+            for relation in self.relations.values()
+            for name in (relation.independent_dataset, relation.dependent_dataset)
+        }
+        refreshed = [
+            name
+            for name in plotted
+            if isinstance(self.dfs[name], LiveFrame) and self.dfs[name].refresh()
+        ]
+        if not refreshed:
+            return
+        for name in refreshed:
+            stale = self.versions[name]
+            self.versions[name] = next(self.version_counter)
+            # Versions are (dataset, column, version) for x and then y
+            self.pipeline.evict(lambda version: stale in version[2::3])
+        self.roi_indexes.clear()
+        selected = self.window["-SELECT_DATASET-"].get()
+        if selected and selected[0] in refreshed:
+            self.display_text("-ROW_COUNT-", len(self.dfs[selected[0]]))
+        self.plot(values)
+
+    def report_live(self) -> None:
+        """Shows the status of the selected live dataset, and stream errors once."""
+        for name, df in self.dfs.items():
+            if isinstance(df, LiveFrame) and df.error is not None:
+                if df not in self.reported:
+                    self.reported.add(df)
+                    popup_error(f"{name} stopped: {df.error}", title="Live source")
+        selected = self.window["-SELECT_DATASET-"].get()
+        if selected and isinstance(self.dfs[selected[0]], LiveFrame):
+            status = self.live_status(selected[0])
+            if self.window["-FILE_SIZE-"].get() != status:
+                self.display_text("-FILE_SIZE-", status)
+
+    def live_status(self, name: str) -> str:
+        df = self.dfs[name]
+        status = f"Live, last {self.datasets[name].capacity:,} rows"
+        if df.skipped:
+            status += f", {df.skipped:,} lines skipped"
+        if df.error is not None:
+            status += f", stopped: {df.error}"
+        return status
+
+    def file_datasets(
+        self, file_name: str, locale: Optional[NumericLocale], units: bool
+    ) -> List[Dataset]:
+        name = splitext(split(file_name)[1])[0]
+        compression = detect(file_name)
+        if compression is None:
+            return [Dataset(name, file_name, locale, units=units)]
+        if compression != Compression.ZIP:
+            # Drop the inner extension too, like data.csv.gz
+            return [Dataset(splitext(name)[0], file_name, locale, units=units)]
+        datasets = [
+            Dataset(f"{name}/{splitext(member)[0]}", file_name, locale, member, units)
+            for member in members(file_name)
+        ]
+        if not datasets:
+            raise UnknownFileTypeError(f"No data files in archive {file_name}")
+        return datasets
+
+    def load_datasets(self, datasets: List[Dataset]) -> List[LazyFrame]:
+        fingerprints = [dataset.fingerprint() for dataset in datasets]
+        # Only the first dataset of each content is loaded, the rest share it
+        loading: Dict[Hashable, Dataset] = {}
+        for dataset, fingerprint in zip(datasets, fingerprints):
+            if fingerprint not in self.fingerprints:
+                loading.setdefault(fingerprint, dataset)
+        if loading:
+            dfs = self.load_parallel(list(loading.values()))
+            self.fingerprints.update(zip(loading, dfs))
+        return [self.fingerprints[fingerprint].share() for fingerprint in fingerprints]
+
+    def load_parallel(self, datasets: List[Dataset]) -> List[LazyFrame]:
+        # Decompression releases the GIL, so files and zip members load in parallel
+        done = [0] * len(datasets)
+        total = sum(
+            span(dataset.file_name, detect(dataset.file_name), dataset.member)[1]
+            for dataset in datasets
+        )
+
+        def progress(index: int, read: int, size: int) -> None:
+            done[index] = read
+
+        workers = min(len(datasets), cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(dataset.load, partial(progress, index))
+                for index, dataset in enumerate(datasets)
+            ]
+            pending = set(futures)
+            while pending:
+                _, pending = wait(pending, timeout=PROGRESS_INTERVAL)
+                self.window["-LOAD_PROGRESS-"].update(
+                    current_count=sum(done),
+                    max=max(total, 1),
+                )
+                self.window.refresh()
+        return [future.result() for future in futures]
+
+    def number_format(self, values: Dict[Any, Any]) -> Optional[NumericLocale]:
+        locale = NUMBER_FORMATS[values["-NUMBER_FORMAT-"]]
+        if locale is None:
+            return None
+        return dataclasses.replace(locale, units=values["-UNITS_SUFFIX-"])
+
     def add_list(self, key: str, item: str) -> int:
         if not self.window[key].metadata["initialized"]:
             self.set_list(key, [])
@@ -469,11 +947,13 @@ class PySimplePlotter:
     def select_dataset(self, name: str) -> None:
         # Update dataset layout
         self.display_input("-RENAME_DATASET-", name)
-        self.display_text("-FILE_NAME-", self.datasets[name].file_name)
-        self.display_text(
-            "-FILE_SIZE-",
-            human_readable(getsize(self.datasets[name].file_name)),
-        )
+        dataset = self.datasets[name]
+        if isinstance(dataset, LiveSource):
+            self.display_text("-FILE_NAME-", dataset.address)
+            self.display_text("-FILE_SIZE-", self.live_status(name))
+        else:
+            self.display_text("-FILE_NAME-", dataset.file_name)
+            self.display_text("-FILE_SIZE-", human_readable(getsize(dataset.file_name)))
         self.display_text("-ROW_COUNT-", len(self.dfs[name].index))
         self.display_text("-COL_COUNT-", len(self.dfs[name].columns))
 
@@ -481,6 +961,69 @@ class PySimplePlotter:
         self.set_list("-SELECT_COL-", self.dfs[name].columns)
         self.select_col(name, self.dfs[name].columns[0])
 
+        self.show_preview(name, 0)
+
+    def show_preview(self, dataset: str, line: int) -> None:
+        line_index = self.dfs[dataset].line_index
+        if line_index is None:
+            # Live sources keep no lines, so don't leave another file's shown
+            self.window["-PREVIEW-"].update("")
+            self.display_text("-PREVIEW_STATUS-", "No lines kept for live sources")
+            return
+        line = max(0, min(line, line_index.line_count - 1))
+        start = max(0, line - PREVIEW_CONTEXT)
+        lines = self.datasets[dataset].preview(line_index, start, PREVIEW_LINES)
+        text = []
+        for number, raw in enumerate(lines, start):
+            marker = ">" if number == line else " "
+            reason = line_index.reason(number, raw)
+            if reason:
+                reason = f"  [{reason}]"
+            text.append(f"{marker}{number + 1:>14,}  {raw.rstrip()}{reason}")
+        self.window["-PREVIEW-"].update("\n".join(text))
+        self.window["-PREVIEW_LINE-"].update(f"{line + 1}")
+        self.display_text(
+            "-PREVIEW_STATUS-",
+            f"{len(line_index.skipped):,} of {line_index.line_count:,} lines skipped",
+        )
+        self.preview_line = line
+
+    def previewed_dataset(self, values: Dict[Any, Any]) -> Optional[str]:
+        """Finds the selected dataset, or None if nothing is selected."""
+        selected = values["-SELECT_DATASET-"]
+        if not selected or selected[0] not in self.dfs:
+            return None
+        return selected[0]
+
+    def jump_preview(self, values: Dict[Any, Any]) -> None:
+        dataset = self.previewed_dataset(values)
+        if dataset is None:
+            return
+        text = values["-PREVIEW_LINE-"].replace(",", "").replace("_", "")
+        try:
+            line = int(text) - 1
+        except ValueError:
+            return
+        self.show_preview(dataset, line)
+
+    def next_skipped(self, values: Dict[Any, Any]) -> None:
+        dataset = self.previewed_dataset(values)
+        if dataset is None or self.dfs[dataset].line_index is None:
+            return
+        line_index = self.dfs[dataset].line_index
+        line = line_index.next_skipped(self.preview_line)
+        if line is not None:
+            self.show_preview(dataset, line)
+
+    def previous_skipped(self, values: Dict[Any, Any]) -> None:
+        dataset = self.previewed_dataset(values)
+        if dataset is None or self.dfs[dataset].line_index is None:
+            return
+        line_index = self.dfs[dataset].line_index
+        line = line_index.previous_skipped(self.preview_line)
+        if line is not None:
+            self.show_preview(dataset, line)
+
     def rename_dataset(self, values: Dict[Any, Any]) -> None:
         old_name = values["-SELECT_DATASET-"][0]
         new_name = values["-RENAME_DATASET-"]
@@ -489,22 +1032,66 @@ class PySimplePlotter:
             name=new_name,
         )
         self.dfs[new_name] = self.dfs.pop(old_name)
+        self.versions[new_name] = self.versions.pop(old_name)
         self.rename_selected("-SELECT_DATASET-", new_name)
 
     def select_col(self, dataset: str, name: str) -> None:
         # TODO: Add error handling
         self.display_input("-RENAME_COL-", name)
-        f = "{0:,.3f}"
-        self.display_text("-MEAN-", f.format(self.dfs[dataset][name].mean()))
-        self.display_text("-MEDIAN-", f.format(self.dfs[dataset][name].median()))
-        self.display_text("-MIN-", f.format(self.dfs[dataset][name].min()))
-        self.display_text("-MAX-", f.format(self.dfs[dataset][name].max()))
+        column = self.dfs[dataset].column(name)
+        series = column.series(name)
+        if column.kind == ColumnType.CATEGORY:
+            f = "{0} categories"
+            self.display_text("-MEAN-", f.format(len(column.categories)))
+            self.display_text("-MEDIAN-", "n/a")
+            self.display_text("-MIN-", "n/a")
+            self.display_text("-MAX-", "n/a")
+            return
+        if column.kind == ColumnType.DATETIME:
+            f = "{0}"
+        else:
+            f = "{0:,.3f}"
+        self.display_text("-MEAN-", f.format(series.mean()))
+        self.display_text("-MEDIAN-", f.format(series.median()))
+        self.display_text("-MIN-", f.format(series.min()))
+        self.display_text("-MAX-", f.format(series.max()))
 
     def rename_col(self, values: Dict[Any, Any]) -> None:
         new_name = values["-RENAME_COL-"]
         self.rename_selected("-SELECT_COL-", new_name)
         dataset = values["-SELECT_DATASET-"][0]
         self.dfs[dataset].columns = self.window["-SELECT_COL-"].get_list_values()
+        self.versions[dataset] = next(self.version_counter)
+        self.roi_indexes.clear()
+
+    def new_col(self, values: Dict[Any, Any]) -> None:
+        selected = values["-SELECT_DATASET-"]
+        if not selected or selected[0] not in self.dfs:
+            return
+        dataset = selected[0]
+        df = self.dfs[dataset]
+        text = popup_get_text(
+            "Expression, or name = expression, like col2 / col2.max()",
+            title="New column",
+        )
+        if not text:
+            return
+        try:
+            name, expression = parse_definition(text)
+            if name is None:
+                name = f"col{len(df.columns) + 1}"
+                while name in df:
+                    name += "'"
+            position = df.define(name, expression)
+        except ExpressionError as e:
+            popup_error(str(e), title="New column")
+            return
+        # A redefined column changes the data of everything computed from it
+        self.versions[dataset] = next(self.version_counter)
+        self.roi_indexes.clear()
+        self.set_list("-SELECT_COL-", df.columns, position)
+        self.display_text("-COL_COUNT-", len(df.columns))
+        self.select_col(dataset, name)
 
     def rename_selected(self, select_key: str, name: str) -> None:
         index = self.window[select_key].get_indexes()[0]
@@ -575,6 +1162,8 @@ class PySimplePlotter:
         self.window["-COLOR-"].update(
             background_color=relation.color,
         )
+        self.display_processing(relation)
+        self.select_roi(name)
         print(self.relations)
 
     def rename_relation(self, values: Dict[Any, Any]) -> None:
@@ -617,6 +1206,7 @@ class PySimplePlotter:
             self.relations[name],
             independent_col=new_independent_col,
         )
+        self.select_roi(name)
 
     def select_dependent_col(self, values: Dict[Any, Any]) -> None:
         name = values["-SELECT_RELATION-"][0]
@@ -625,6 +1215,7 @@ class PySimplePlotter:
             self.relations[name],
             dependent_col=new_dependent_col,
         )
+        self.select_roi(name)
 
     # TODO: Refactor selection functions into one which takes the field as an argument
     def select_color(self, values: Dict[Any, Any]) -> None:
@@ -639,67 +1230,312 @@ class PySimplePlotter:
             color=new_color,
         )
 
+    def processing_stages(self, values: Dict[Any, Any]) -> Tuple[Stage, ...]:
+        stages = []
+        if values["-SMOOTHING-"] != "None":
+            stages.append(
+                Smooth(
+                    values["-SMOOTHING-"],
+                    int(values["-SMOOTHING_WINDOW-"]),
+                    int(values["-SMOOTHING_ORDER-"]),
+                )
+            )
+        if values["-BASELINE-"] != "None":
+            stages.append(
+                Baseline(
+                    values["-BASELINE-"],
+                    int(values["-BASELINE_DEGREE-"]),
+                    float(values["-BASELINE_LAMBDA-"]),
+                    float(values["-BASELINE_P-"]),
+                )
+            )
+        if values["-NORMALIZE-"] != "None":
+            stages.append(Normalize(values["-NORMALIZE-"]))
+        if values["-DERIVATIVE-"] != "None":
+            stages.append(Derivative(int(values["-DERIVATIVE-"])))
+        return tuple(stages)
+
+    def select_processing(self, values: Dict[Any, Any]) -> None:
+        selected = values["-SELECT_RELATION-"]
+        if not selected or selected[0] not in self.relations:
+            return
+        name = selected[0]
+        try:
+            processing = self.processing_stages(values)
+        except (ValueError, ProcessingError):
+            return  # Wait until the parameter being typed is valid
+        self.relations[name] = dataclasses.replace(
+            self.relations[name],
+            processing=processing,
+        )
+        self.select_roi(name)
+
+    def display_processing(self, relation: Relation) -> None:
+        for key in ("-SMOOTHING-", "-BASELINE-", "-NORMALIZE-", "-DERIVATIVE-"):
+            self.window[key].update(value="None")
+        for stage in relation.processing:
+            if isinstance(stage, Smooth):
+                self.window["-SMOOTHING-"].update(value=stage.method)
+                self.window["-SMOOTHING_WINDOW-"].update(str(stage.window))
+                self.window["-SMOOTHING_ORDER-"].update(str(stage.order))
+            if isinstance(stage, Baseline):
+                self.window["-BASELINE-"].update(value=stage.method)
+                self.window["-BASELINE_DEGREE-"].update(str(stage.degree))
+                self.window["-BASELINE_LAMBDA-"].update(f"{stage.lam:g}")
+                self.window["-BASELINE_P-"].update(f"{stage.p:g}")
+            if isinstance(stage, Normalize):
+                self.window["-NORMALIZE-"].update(value=stage.method)
+            if isinstance(stage, Derivative):
+                self.window["-DERIVATIVE-"].update(value=str(stage.order))
+
+    def version(self, relation: Relation) -> Hashable:
+        x_dataset = relation.independent_dataset
+        y_dataset = relation.dependent_dataset
+        return (
+            x_dataset,
+            relation.independent_col,
+            self.versions[x_dataset],
+            y_dataset,
+            relation.dependent_col,
+            self.versions[y_dataset],
+        )
+
+    def processed(self, relation: Relation) -> Tuple[ndarray, ndarray]:
+        x = self.dfs[relation.independent_dataset].column(relation.independent_col)
+        y = self.dfs[relation.dependent_dataset].column(relation.dependent_col)
+        return x.numeric, self.pipeline.run(
+            self.version(relation), x.numeric, y.numeric, relation.processing
+        )
+
+    def limits(
+        self, relation: Relation
+    ) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+        """Finds the x and y limits of a relation from cached column limits."""
+        x = self.dfs[relation.independent_dataset].column(relation.independent_col)
+        y = self.dfs[relation.dependent_dataset].column(relation.dependent_col)
+        if not relation.processing:
+            return x.limits, y.limits
+        y_limits = self.pipeline.limits(
+            self.version(relation), x.numeric, y.numeric, relation.processing
+        )
+        return x.limits, y_limits
+
+    def roi_index(self, name: str) -> RoiIndex:
+        relation = self.relations[name]
+        if name not in self.roi_indexes or self.roi_indexes[name][0] != relation:
+            x, y = self.processed(relation)
+            self.roi_indexes[name] = (relation, RoiIndex(x, y))
+        return self.roi_indexes[name][1]
+
+    def x_datetime(self) -> bool:
+        """Checks if the x column of the selected relation holds datetimes."""
+        selected = self.window["-SELECT_RELATION-"].get()
+        if not selected or selected[0] not in self.relations:
+            return False
+        relation = self.relations[selected[0]]
+        x = self.dfs[relation.independent_dataset].column(relation.independent_col)
+        return x.kind == ColumnType.DATETIME
+
+    def roi_bound(self, text: str, datetime: bool) -> Optional[float]:
+        try:
+            value = float(text)
+            return None if isnan(value) else value
+        except ValueError:
+            if not datetime:
+                return None
+        try:
+            timestamp = Timestamp(text)
+            if isna(timestamp):
+                return None
+            # Datetime bounds are epoch nanoseconds like the column values
+            return float(timestamp.value)
+        except (ValueError, OverflowError):
+            # Dates outside the nanosecond range overflow
+            return None
+
+    def roi_bounds(self) -> Optional[Tuple[float, float]]:
+        datetime = self.x_datetime()
+        low = self.roi_bound(self.window["-ROI_LOW-"].get(), datetime)
+        high = self.roi_bound(self.window["-ROI_HIGH-"].get(), datetime)
+        if low is None or high is None:
+            return None
+        return min(low, high), max(low, high)
+
+    def format_roi_bound(self, value: float) -> str:
+        if self.rendering is not None and self.rendering.x_datetime:
+            return Timestamp(int(value)).isoformat()
+        return f"{value:g}"
+
+    def select_roi(self, name: Optional[str]) -> None:
+        bounds = self.roi_bounds()
+        if bounds is None:
+            return
+        self.draw_roi_span(*bounds)
+        if name in self.relations:
+            self.display_roi(name, *bounds)
+
+    def drag_roi(self, low: float, high: float, exact: bool = True) -> None:
+        self.window["-ROI_LOW-"].update(self.format_roi_bound(low))
+        self.window["-ROI_HIGH-"].update(self.format_roi_bound(high))
+        self.draw_roi_span(low, high)
+        selected = self.window["-SELECT_RELATION-"].get()
+        if selected and selected[0] in self.relations:
+            self.display_roi(selected[0], low, high, exact)
+
+    def display_roi(self, name: str, low: float, high: float, exact: bool = True) -> None:
+        stats = self.roi_index(name).stats(low, high, exact)
+        f = "{0:,.3f}"
+        self.display_text("-ROI_COUNT-", f"{stats.count:,}")
+        self.display_text("-ROI_MEAN-", f.format(stats.mean))
+        self.display_text("-ROI_STD-", f.format(stats.std))
+        self.display_text("-ROI_MEDIAN-", f.format(stats.median))
+        self.display_text("-ROI_MIN-", f.format(stats.min))
+        self.display_text("-ROI_MAX-", f.format(stats.max))
+
+    def trace(self, relation: Relation) -> Trace:
+        x, y = self.processed(relation)
+        # Datetime columns are plotted as dates unless they were processed
+        x_column = self.dfs[relation.independent_dataset].column(
+            relation.independent_col
+        )
+        y_column = self.dfs[relation.dependent_dataset].column(relation.dependent_col)
+        x = x_column.plottable()
+        if not relation.processing:
+            y = y_column.plottable()
+        return Trace(x, y, relation.color, relation.name)
+
+    def plot_spec(self, values: Dict[Any, Any]) -> Spec:
+        # Parse the columns of every relation with one pass per dataset
+        cols: Dict[str, List[str]] = {}
+        for relation in self.relations.values():
+            cols.setdefault(relation.independent_dataset, []).append(
+                relation.independent_col
+            )
+            cols.setdefault(relation.dependent_dataset, []).append(
+                relation.dependent_col
+            )
+        for dataset, dataset_cols in cols.items():
+            self.dfs[dataset].prefetch(dataset_cols)
+
+        x_label = f"{values['-X_AXIS_LABEL-']}"
+        if values["-X_AXIS_UNITS-"]:
+            x_label += f" ({values['-X_AXIS_UNITS-']})"
+        y_label = f"{values['-Y_AXIS_LABEL-']}"
+        if values["-Y_AXIS_UNITS-"]:
+            y_label += f" ({values['-Y_AXIS_UNITS-']})"
+        if values["-LAYOUT-"] != "Single":
+            return self.grid_spec(values, x_label, y_label)
+
+        traces = [self.trace(relation) for relation in self.relations.values()]
+        return PlotSpec(
+            tuple(traces),
+            values["-PLOT_TITLE-"],
+            x_label,
+            y_label,
+            bool(values["-LEGEND-"]),
+            values["-STYLE-"],
+            CANVAS_SIZE,
+            animated=any(isinstance(self.dfs[name], LiveFrame) for name in cols),
+        )
+
+    def grid_spec(self, values: Dict[Any, Any], x_label: str, y_label: str) -> GridSpec:
+        panels: Dict[str, List[Trace]] = {}
+        x_limits: List[Tuple[float, float]] = []
+        y_limits: List[Tuple[float, float]] = []
+        for name, relation in self.relations.items():
+            if values["-LAYOUT-"] == "Grid by dataset":
+                name = relation.dependent_dataset
+            panels.setdefault(name, []).append(self.trace(relation))
+            relation_x_limits, relation_y_limits = self.limits(relation)
+            x_limits.append(relation_x_limits)
+            y_limits.append(relation_y_limits)
+        return GridSpec(
+            tuple(Panel(name, tuple(traces)) for name, traces in panels.items()),
+            shared_limits(x_limits),
+            shared_limits(y_limits),
+            values["-PLOT_TITLE-"],
+            x_label,
+            y_label,
+            bool(values["-LEGEND-"]),
+            values["-STYLE-"],
+            CANVAS_SIZE,
+        )
+
     def plot(self, values: Dict[Any, Any]) -> None:
         # TODO: Add error handling
-        if values["-STYLE-"] == "Default":
-            style = {
-                "axes.edgecolor": "black",
-                "axes.facecolor": "white",
-                "axes.labelcolor": "black",
-                "axes.prop_cycle": plt.cycler(
-                    "color", ["0.00", "0.40", "0.60", "0.70"]
-                ),
-                "figure.edgecolor": "white",
-                "figure.facecolor": "0.75",
-                "grid.color": "black",
-                "image.cmap": "gray",
-                "lines.color": "black",
-                "patch.edgecolor": "black",
-                "patch.facecolor": "gray",
-                "savefig.edgecolor": "white",
-                "savefig.facecolor": "white",
-                "text.color": "black",
-                "xtick.color": "black",
-                "ytick.color": "black",
-            }
+        self.spec = self.plot_spec(values)
+        self.renderer.submit(self.spec)
+
+    def deliver_rendering(self, rendering: Union[Rendering, Exception]) -> None:
+        # Called from the render thread. Only the generation goes through the
+        # event queue, the image waits in the delivered queue
+        self.delivered.put(rendering)
+        generation = getattr(rendering, "generation", None)
+        self.window.write_event_value("-RENDERED-", generation)
+
+    def show_rendering(self) -> None:
+        rendering = self.delivered.get_nowait()
+        if isinstance(rendering, Exception):
+            popup_error(str(rendering), title="Plot")
+            return
+        if not self.renderer.is_current(rendering.generation):
+            return
+        canvas = self.window["-CANVAS-"].TKCanvas
+        self.photo = PhotoImage(master=canvas, data=rendering.ppm)
+        if self.canvas_image is None:
+            self.canvas_image = canvas.create_image(0, 0, image=self.photo, anchor="nw")
         else:
-            raise ValueError("No such style")
-        # Create plot
-        with plt.style.context(style):
-            self.fig, self.ax = plt.subplots()
-        for name, relation in self.relations.items():
-            print(f"Plotting {name}: {relation}")
-            x_df = self.dfs[relation.independent_dataset]
-            x_col = relation.independent_col
-            x_label = f"{values['-X_AXIS_LABEL-']}"
-            if values["-X_AXIS_UNITS-"]:
-                x_label += f" ({values['-X_AXIS_UNITS-']})"
-            y_df = self.dfs[relation.dependent_dataset]
-            y_col = relation.dependent_col
-            y_label = f"{values['-Y_AXIS_LABEL-']}"
-            if values["-Y_AXIS_UNITS-"]:
-                y_label += f" ({values['-Y_AXIS_UNITS-']})"
-            self.ax.set_title(values["-PLOT_TITLE-"])
-            self.ax.set_xlabel(x_label)
-            self.ax.set_ylabel(y_label)
-            self.ax.plot(
-                x_df[x_col],
-                y_df[y_col],
-                color=relation.color,
-                label=relation.name,
-            )
+            canvas.itemconfigure(self.canvas_image, image=self.photo)
+        self.rendering = rendering
+        bounds = self.roi_bounds()
+        if bounds is not None:
+            self.draw_roi_span(*bounds)
+
+    def bind_canvas(self) -> None:
+        canvas = self.window["-CANVAS-"].TKCanvas
+        canvas.bind("<ButtonPress-1>", self.press_canvas)
+        canvas.bind("<B1-Motion>", self.drag_canvas)
+        canvas.bind("<ButtonRelease-1>", self.release_canvas)
 
-        # Display plot
-        if values["-LEGEND-"]:
-            self.ax.legend()
-        fig_agg = FigureCanvasTkAgg(self.fig, self.window["-CANVAS-"].TKCanvas)
-        fig_agg.get_tk_widget().pack()
-        fig_agg.draw()
+    def press_canvas(self, event: Event) -> None:
+        if self.rendering is None:
+            return
+        left, top, right, bottom = self.rendering.axes_box
+        if left <= event.x <= right and top <= event.y <= bottom:
+            self.roi_anchor = self.rendering.x_data(event.x)
+
+    def drag_canvas(self, event: Event, exact: bool = False) -> None:
+        if self.roi_anchor is None:
+            return
+        left, _, right, _ = self.rendering.axes_box
+        x = self.rendering.x_data(min(max(event.x, left), right))
+        self.drag_roi(min(self.roi_anchor, x), max(self.roi_anchor, x), exact)
+
+    def release_canvas(self, event: Event) -> None:
+        self.drag_canvas(event, exact=True)
+        self.roi_anchor = None
+
+    def draw_roi_span(self, low: float, high: float) -> None:
+        if self.rendering is None:
+            return
+        canvas = self.window["-CANVAS-"].TKCanvas
+        left, top, right, bottom = self.rendering.axes_box
+        x0 = min(max(self.rendering.x_pixel(low), left), right)
+        x1 = min(max(self.rendering.x_pixel(high), left), right)
+        if self.roi_span is None:
+            self.roi_span = canvas.create_rectangle(
+                x0, top, x1, bottom, fill="steel blue", stipple="gray25", outline=""
+            )
+        else:
+            canvas.coords(self.roi_span, x0, top, x1, bottom)
+        canvas.tag_raise(self.roi_span)
 
     def save_plot(self) -> None:
-        file_name = popup_get_file("Choose where to save your plot")
+        if self.spec is None:
+            return
+        file_name = popup_get_file("Choose where to save your plot", save_as=True)
         if file_name:
-            self.fig.savefig(file_name)
+            self.renderer.save(self.spec, file_name)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 
 from dataclasses import dataclass
+from typing import Tuple
+
+from pysimpleplotter.processing import Stage
+
 
 @dataclass(frozen=True)
 class Relation:
@@ -10,3 +14,4 @@ class Relation:
     dependent_dataset: str
     dependent_col: str
     color: str
+    processing: Tuple[Stage, ...] = ()
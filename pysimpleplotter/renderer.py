@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from math import ceil, isfinite, sqrt
+from multiprocessing import get_context
+from os import cpu_count
+from queue import Queue
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+
+import matplotlib.style
+from cycler import cycler
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.dates import date2num
+from matplotlib.figure import Figure
+from numpy import (
+    arange,
+    array,
+    asarray,
+    concatenate,
+    datetime64,
+    inf,
+    isnan,
+    ndarray,
+    sort,
+    stack,
+    where,
+)
+
+
+DAY_NANOSECONDS = 86400e9
+
+# The axes of every grid panel, as left, bottom, width and height fractions
+PANEL_AXES = (0.18, 0.16, 0.78, 0.66)
+# Pixels around the grid for the title and axis labels
+GRID_MARGINS = (24, 24, 4, 24)
+# Padding added to shared limits, like matplotlib's axes.xmargin
+LIMIT_MARGIN = 0.05
+# Room left around live data, so the axes are only redrawn now and then
+LIVE_HEADROOM = 0.1
+
+STYLES = {
+    "Default": {
+        "axes.edgecolor": "black",
+        "axes.facecolor": "white",
+        "axes.labelcolor": "black",
+        "axes.prop_cycle": cycler("color", ["0.00", "0.40", "0.60", "0.70"]),
+        "figure.edgecolor": "white",
+        "figure.facecolor": "0.75",
+        "grid.color": "black",
+        "image.cmap": "gray",
+        "lines.color": "black",
+        "patch.edgecolor": "black",
+        "patch.facecolor": "gray",
+        "savefig.edgecolor": "white",
+        "savefig.facecolor": "white",
+        "text.color": "black",
+        "xtick.color": "black",
+        "ytick.color": "black",
+    },
+}
+
+
+@dataclass(frozen=True)
+class Trace:
+    x: ndarray
+    y: ndarray
+    color: str
+    label: str
+
+
+@dataclass(frozen=True)
+class PlotSpec:
+    """Everything needed to draw a plot, independent of the GUI state.
+
+    Attributes:
+        animated: Whether the traces are live data, which is redrawn by
+            moving the lines of the last plot to the new data
+    """
+
+    traces: Tuple[Trace, ...]
+    title: str = ""
+    x_label: str = ""
+    y_label: str = ""
+    legend: bool = False
+    style: str = "Default"
+    size: Tuple[int, int] = (640, 480)
+    dpi: int = 100
+    animated: bool = False
+
+
+@dataclass(frozen=True)
+class Panel:
+    title: str
+    traces: Tuple[Trace, ...]
+
+
+@dataclass(frozen=True)
+class GridSpec:
+    """A grid of small plots which share their axis limits.
+
+    Attributes:
+        panels: The Panels in row-major order
+        x_limits: The lowest and highest x of all traces, or None, in
+            epoch nanoseconds for datetimes
+        y_limits: The lowest and highest y of all traces, or None, in
+            epoch nanoseconds for datetimes
+    """
+
+    panels: Tuple[Panel, ...]
+    x_limits: Optional[Tuple[float, float]]
+    y_limits: Optional[Tuple[float, float]]
+    title: str = ""
+    x_label: str = ""
+    y_label: str = ""
+    legend: bool = False
+    style: str = "Default"
+    size: Tuple[int, int] = (640, 480)
+    dpi: int = 100
+
+
+Spec = Union[PlotSpec, GridSpec]
+
+
+@dataclass(frozen=True)
+class Rendering:
+    """A drawn PlotSpec.
+
+    Attributes:
+        generation: The number of the request which produced this rendering
+        image: A height x width x 4 RGBA copy of the Agg buffer
+        ppm: The image as binary PPM data for a Tk PhotoImage
+        axes_box: The left, top, right and bottom pixels of the axes
+        x_limits: The data limits of the x axis, in epoch nanoseconds for
+            datetime axes
+        x_datetime: Whether the x axis shows datetimes
+    """
+
+    generation: int
+    image: ndarray
+    ppm: bytes
+    axes_box: Tuple[float, float, float, float]
+    x_limits: Tuple[float, float]
+    x_datetime: bool = False
+
+    def x_data(self, x_pixel: float) -> float:
+        left, _, right, _ = self.axes_box
+        low, high = self.x_limits
+        return low + (x_pixel - left) / (right - left) * (high - low)
+
+    def x_pixel(self, x_data: float) -> float:
+        left, _, right, _ = self.axes_box
+        low, high = self.x_limits
+        return left + (x_data - low) / (high - low) * (right - left)
+
+
+def style(spec: Spec) -> Any:
+    if spec.style not in STYLES:
+        raise ValueError("No such style")
+    return matplotlib.style.context(STYLES[spec.style])
+
+
+def figure(spec: PlotSpec) -> Figure:
+    width, height = spec.size
+    fig = Figure(figsize=(width / spec.dpi, height / spec.dpi), dpi=spec.dpi)
+    ax = fig.add_subplot()
+    ax.set_title(spec.title)
+    ax.set_xlabel(spec.x_label)
+    ax.set_ylabel(spec.y_label)
+    for trace in spec.traces:
+        ax.plot(trace.x, trace.y, color=trace.color, label=trace.label)
+    if spec.legend:
+        ax.legend()
+    return fig
+
+
+def ppm(image: ndarray) -> bytes:
+    height, width = image.shape[:2]
+    return b"P6 %d %d 255\n" % (width, height) + image[..., :3].tobytes()
+
+
+def same_traces(traces: Tuple[Trace, ...], others: Tuple[Trace, ...]) -> bool:
+    """Compares traces by array identity, which is free unlike their values."""
+    return len(traces) == len(others) and all(
+        trace.x is other.x and trace.y is other.y and trace.color == other.color
+        for trace, other in zip(traces, others)
+    )
+
+
+def decimate(x: ndarray, y: ndarray, buckets: int) -> Tuple[ndarray, ndarray]:
+    """Keeps the lowest and highest point of each of buckets runs of points.
+
+    With a bucket per pixel column the line covers the same pixels as one
+    through every point, at a fraction of the cost to draw.
+    """
+    size = len(y) // buckets
+    if size < 4 or y.dtype.kind != "f":
+        return x, y
+    end = size * buckets
+    runs = y[:end].reshape(buckets, size)
+    starts = arange(0, end, size)
+    # argmin and argmax would pick NaN over any number
+    missing = isnan(runs)
+    lows = where(missing, inf, runs).argmin(axis=1) + starts
+    highs = where(missing, -inf, runs).argmax(axis=1) + starts
+    indexes = concatenate(
+        (sort(stack((lows, highs), axis=1), axis=1).ravel(), arange(end, len(y)))
+    )
+    return x[indexes], y[indexes]
+
+
+def followed(
+    limits: Tuple[float, float], low: float, high: float
+) -> Tuple[float, float]:
+    """Keeps axis limits while the data fills most of them.
+
+    Otherwise the data gets new limits with LIVE_HEADROOM to grow into.
+    """
+    if not (isfinite(low) and isfinite(high)):
+        return limits
+    limit_low, limit_high = limits
+    inside = limit_low <= low and high <= limit_high
+    if inside and (high - low) * 2 >= limit_high - limit_low:
+        return limits
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    headroom = (high - low) * LIVE_HEADROOM
+    return low - headroom, high + headroom
+
+
+class Layers:
+    """A drawn plot whose data layer is kept to redraw its decorations.
+
+    The data layer is the figure drawn without its title, axis labels and
+    legend, which sit in the same place whatever their text. Decoration
+    edits restore the saved data layer and draw only those artists over it.
+    Animated plots leave their lines out of the data layer too, and move
+    them to each frame's data in place.
+
+    Attributes:
+        spec: The PlotSpec the data layer was drawn for
+        fig: The Figure, kept alive between renders
+        canvas: The FigureCanvasAgg of fig
+        background: The data layer saved with copy_from_bbox
+        legend_locations: A dict of trace labels mapped to where the legend
+            was placed, since finding the best place scans all the data
+    """
+
+    def __init__(self, spec: PlotSpec):
+        self.spec = spec
+        with style(spec):
+            undecorated = replace(spec, title="", x_label="", y_label="", legend=False)
+            self.fig = figure(undecorated)
+            if spec.animated:
+                for line in self.fig.axes[0].get_lines():
+                    line.set_animated(True)
+            self.canvas = FigureCanvasAgg(self.fig)
+            self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.legend_locations: Dict[Tuple[str, ...], Tuple[float, float]] = {}
+
+    def fits(self, spec: PlotSpec) -> bool:
+        """Checks if spec differs from the drawn spec only in decorations.
+
+        Animated specs may also differ in the data of their traces.
+        """
+        if spec.animated:
+            traces = len(spec.traces) == len(self.spec.traces) and all(
+                trace.color == other.color
+                for trace, other in zip(spec.traces, self.spec.traces)
+            )
+        else:
+            traces = same_traces(spec.traces, self.spec.traces)
+        return (
+            spec.style == self.spec.style
+            and spec.size == self.spec.size
+            and spec.dpi == self.spec.dpi
+            and spec.animated == self.spec.animated
+            and traces
+        )
+
+    def animate(self, spec: PlotSpec) -> None:
+        """Moves the lines to the data of spec.
+
+        The data layer is only redrawn when the data outgrows the axes or
+        shrinks well inside them, since that changes the ticks.
+        """
+        ax = self.fig.axes[0]
+        for line, trace in zip(ax.get_lines(), spec.traces):
+            line.set_data(*decimate(trace.x, trace.y, spec.size[0]))
+        ax.relim()
+        (x_low, y_low), (x_high, y_high) = ax.dataLim.get_points()
+        limits = (ax.get_xlim(), ax.get_ylim())
+        x_limits = followed(limits[0], x_low, x_high)
+        y_limits = followed(limits[1], y_low, y_high)
+        if (x_limits, y_limits) == limits:
+            return
+        ax.set_xlim(*x_limits)
+        ax.set_ylim(*y_limits)
+        ax.set_title("")
+        ax.set_xlabel("")
+        ax.set_ylabel("")
+        if ax.get_legend() is not None:
+            ax.get_legend().remove()
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+    def render(self, spec: PlotSpec, generation: int = 0) -> Rendering:
+        ax = self.fig.axes[0]
+        with style(spec):
+            if spec.animated:
+                self.animate(spec)
+            ax.set_title(spec.title)
+            ax.set_xlabel(spec.x_label)
+            ax.set_ylabel(spec.y_label)
+            for line, trace in zip(ax.get_lines(), spec.traces):
+                line.set_label(trace.label)
+            if ax.get_legend() is not None:
+                ax.get_legend().remove()
+            artists = [ax.title, ax.xaxis.label, ax.yaxis.label]
+            if spec.animated:
+                artists = [*ax.get_lines(), *artists]
+            labels = tuple(trace.label for trace in spec.traces)
+            if spec.legend:
+                artists.append(ax.legend(loc=self.legend_locations.get(labels, "best")))
+            self.canvas.restore_region(self.background)
+            for artist in artists:
+                ax.draw_artist(artist)
+            if spec.legend and labels not in self.legend_locations:
+                # The lower left corner of the legend in axes coordinates
+                extent = artists[-1].get_window_extent()
+                corner = ax.transAxes.inverted().transform((extent.x0, extent.y0))
+                self.legend_locations[labels] = tuple(corner)
+        # A copy, since the buffer is drawn over by the next decoration edit
+        image = array(self.canvas.buffer_rgba())
+        height = image.shape[0]
+        box = ax.bbox
+        x_limits = ax.get_xlim()
+        x_datetime = any(trace.x.dtype.kind == "M" for trace in spec.traces)
+        if x_datetime:
+            # Matplotlib date numbers are days since its epoch
+            epoch = date2num(datetime64(0, "ns"))
+            x_limits = tuple((limit - epoch) * DAY_NANOSECONDS for limit in x_limits)
+        return Rendering(
+            generation,
+            image,
+            ppm(image),
+            (box.x0, height - box.y1, box.x1, height - box.y0),
+            x_limits,
+            x_datetime,
+        )
+
+
+def render(spec: PlotSpec, generation: int = 0) -> Rendering:
+    return Layers(spec).render(spec, generation)
+
+
+def save(spec: Spec, file_name: str, pool: Optional[Executor] = None) -> None:
+    if isinstance(spec, GridSpec):
+        image = render_grid(spec, pool=pool).image
+        width, height = spec.size
+        fig = Figure(figsize=(width / spec.dpi, height / spec.dpi), dpi=spec.dpi)
+        fig.figimage(image)
+        fig.savefig(file_name, dpi=spec.dpi)
+        return
+    with style(spec):
+        figure(spec).savefig(file_name)
+
+
+def grid_shape(count: int) -> Tuple[int, int]:
+    """Finds the rows and columns of the squarest grid with count panels."""
+    columns = max(1, ceil(sqrt(count)))
+    return max(1, ceil(count / columns)), columns
+
+
+def padded(limits: Optional[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    if limits is None or not all(isfinite(limit) for limit in limits):
+        return None
+    low, high = limits
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    margin = (high - low) * LIMIT_MARGIN
+    return low - margin, high + margin
+
+
+def datetime_limits(limits: Tuple[float, float]) -> Tuple[datetime64, datetime64]:
+    """Converts limits in epoch nanoseconds to datetimes."""
+    return tuple(datetime64(int(limit), "ns") for limit in limits)
+
+
+def render_panel(
+    panel: Panel,
+    style_name: str,
+    size: Tuple[int, int],
+    dpi: int,
+    x_limits: Optional[Tuple[float, float]],
+    y_limits: Optional[Tuple[float, float]],
+    x_ticks: bool,
+    y_ticks: bool,
+    legend: bool,
+) -> ndarray:
+    """Draws one grid panel to an RGBA array.
+
+    Runs in a worker process, so it takes only what the panel needs.
+    """
+    with matplotlib.style.context(STYLES[style_name]):
+        width, height = size
+        fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        ax = fig.add_axes(PANEL_AXES)
+        ax.set_title(panel.title, fontsize="small", pad=2)
+        for trace in panel.traces:
+            ax.plot(trace.x, trace.y, color=trace.color, label=trace.label)
+        if x_limits is not None:
+            if any(trace.x.dtype.kind == "M" for trace in panel.traces):
+                x_limits = datetime_limits(x_limits)
+            ax.set_xlim(*x_limits)
+        if y_limits is not None:
+            if any(trace.y.dtype.kind == "M" for trace in panel.traces):
+                y_limits = datetime_limits(y_limits)
+            ax.set_ylim(*y_limits)
+        ax.tick_params(labelsize="x-small", labelbottom=x_ticks, labelleft=y_ticks)
+        if legend:
+            ax.legend(fontsize="x-small")
+        canvas = FigureCanvasAgg(fig)
+        canvas.draw()
+    return asarray(canvas.buffer_rgba())
+
+
+def panel_key(job: Tuple) -> Hashable:
+    panel, *settings = job
+    traces = tuple((id(t.x), id(t.y), t.color, t.label) for t in panel.traces)
+    return (panel.title, traces, *settings)
+
+
+def render_grid(
+    spec: GridSpec,
+    generation: int = 0,
+    pool: Optional[Executor] = None,
+    cache: Optional[Dict[Hashable, Tuple[Tuple, ndarray]]] = None,
+) -> Rendering:
+    """Draws each panel separately, in the pool if given, and composites them.
+
+    The shared limits come from the spec, so no panel has to see another's
+    data. Tick labels are only drawn on the left column and bottom row.
+
+    Args:
+        cache: A dict of the panels drawn last time, which is updated to
+            this grid's panels. Panels found in it are not drawn again, so
+            title and label edits only redraw the frame around the panels.
+    """
+    count = len(spec.panels)
+    rows, columns = grid_shape(count)
+    width, height = spec.size
+    left, top, right, bottom = GRID_MARGINS
+    panel_width = (width - left - right) // columns
+    panel_height = (height - top - bottom) // rows
+    x_limits = padded(spec.x_limits)
+    y_limits = padded(spec.y_limits)
+    jobs = [
+        (
+            panel,
+            spec.style,
+            (panel_width, panel_height),
+            spec.dpi,
+            x_limits,
+            y_limits,
+            i + columns >= count,
+            i % columns == 0,
+            spec.legend,
+        )
+        for i, panel in enumerate(spec.panels)
+    ]
+    if cache is None:
+        cache = {}
+    keys = [panel_key(job) for job in jobs]
+    missing = [job for key, job in zip(keys, jobs) if key not in cache]
+    mapper = map if pool is None else pool.map
+    drawn = iter(mapper(render_panel, *zip(*missing)) if missing else [])
+    # The jobs are kept with the images so the arrays keyed by id stay alive
+    panels = {
+        key: cache[key] if key in cache else (job, next(drawn))
+        for key, job in zip(keys, jobs)
+    }
+    cache.clear()
+    cache.update(panels)
+    images = [panels[key][1] for key in keys]
+
+    with style(spec):
+        fig = Figure(figsize=(width / spec.dpi, height / spec.dpi), dpi=spec.dpi)
+        # Center the title and labels in the margins around the panels
+        fig.suptitle(spec.title, y=1 - top / 2 / height, va="center")
+        fig.supxlabel(spec.x_label, y=bottom / 2 / height, va="center")
+        fig.supylabel(spec.y_label, x=left / 2 / width, ha="center")
+        canvas = FigureCanvasAgg(fig)
+        canvas.draw()
+    image = array(canvas.buffer_rgba())
+    for i, panel_image in enumerate(images):
+        row, column = divmod(i, columns)
+        x = left + column * panel_width
+        y = top + row * panel_height
+        panel_image = panel_image[: image.shape[0] - y, : image.shape[1] - x]
+        image[y : y + panel_image.shape[0], x : x + panel_image.shape[1]] = panel_image
+
+    # ROIs are dragged on the first panel, which has the same x axis as all
+    axes_left, axes_bottom, axes_width, axes_height = PANEL_AXES
+    box = (
+        left + axes_left * panel_width,
+        top + (1 - axes_bottom - axes_height) * panel_height,
+        left + (axes_left + axes_width) * panel_width,
+        top + (1 - axes_bottom) * panel_height,
+    )
+    x_datetime = any(
+        trace.x.dtype.kind == "M" for panel in spec.panels for trace in panel.traces
+    )
+    return Rendering(
+        generation,
+        image,
+        ppm(image),
+        box,
+        x_limits if x_limits is not None else (0.0, 1.0),
+        x_datetime,
+    )
+
+
+class RenderWorker:
+    """Draws PlotSpecs with Agg on a background thread.
+
+    Only the newest plot is drawn: requests superseded while queued are
+    dropped, and renderings superseded while drawing are discarded. Saves are
+    never dropped. The data layer of the last plot is kept, so edits to its
+    title, labels or legend only redraw those. Grid panels are drawn in a pool
+    of processes, which is started the first time a grid is drawn.
+
+    Attributes:
+        deliver: A function called from the worker thread with each current
+            Rendering, or with the exception a request raised
+        requests: A Queue of (generation, spec, file name) requests
+        generation: The number of the newest plot request
+        pool: A ProcessPoolExecutor for grid panels, or None
+        layers: The Layers of the last single plot, or None
+        panels: The panels of the last grid, see render_grid
+    """
+
+    def __init__(self, deliver: Callable[[Union[Rendering, Exception]], None]):
+        self.deliver = deliver
+        self.requests: Queue = Queue()
+        self.generation = 0
+        self.lock = Lock()
+        self.thread: Optional[Thread] = None
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.layers: Optional[Layers] = None
+        self.panels: Dict[Hashable, Tuple[Tuple, ndarray]] = {}
+
+    def start(self) -> None:
+        self.thread = Thread(target=self.run, name="RenderWorker", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.requests.put(None)
+
+    def submit(self, spec: Spec) -> int:
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        self.requests.put((generation, spec, None))
+        return generation
+
+    def save(self, spec: Spec, file_name: str) -> None:
+        self.requests.put((None, spec, file_name))
+
+    def is_current(self, generation: int) -> bool:
+        return generation == self.generation
+
+    def panel_pool(self, spec: Spec) -> Optional[Executor]:
+        if not isinstance(spec, GridSpec):
+            return None
+        if self.pool is None:
+            # Spawned workers don't inherit the GUI's threads or Tk state
+            self.pool = ProcessPoolExecutor(
+                cpu_count(), mp_context=get_context("spawn")
+            )
+        return self.pool
+
+    def render(self, spec: Spec, generation: int) -> Rendering:
+        if isinstance(spec, GridSpec):
+            return render_grid(
+                spec, generation, self.panel_pool(spec), self.panels
+            )
+        # Only data changes redraw the data layer
+        if self.layers is None or not self.layers.fits(spec):
+            self.layers = Layers(spec)
+        return self.layers.render(spec, generation)
+
+    def run(self) -> None:
+        while True:
+            request = self.requests.get()
+            if request is None:
+                if self.pool is not None:
+                    self.pool.shutdown(cancel_futures=True)
+                return
+            generation, spec, file_name = request
+            try:
+                if file_name is not None:
+                    save(spec, file_name, self.panel_pool(spec))
+                elif self.is_current(generation):
+                    rendering = self.render(spec, generation)
+                    if self.is_current(generation):
+                        self.deliver(rendering)
+            except Exception as e:
+                self.deliver(e)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+from numpy import (
+    argsort,
+    concatenate,
+    cumsum,
+    float64,
+    isfinite,
+    maximum,
+    minimum,
+    nan,
+    ndarray,
+    partition,
+    sqrt,
+)
+
+
+# Larger ranges use a strided sample when an approximate median is enough
+APPROXIMATE_MEDIAN_SIZE = 1 << 14
+
+
+@dataclass(frozen=True)
+class RoiStats:
+    count: int
+    mean: float
+    std: float
+    median: float
+    min: float
+    max: float
+
+
+def sparse_table(
+    values: ndarray, reduce: Callable[[ndarray, ndarray], ndarray]
+) -> List[ndarray]:
+    table = [values]
+    width = 1
+    while 2 * width <= len(values):
+        previous = table[-1]
+        table.append(reduce(previous[:-width], previous[width:]))
+        width *= 2
+    return table
+
+
+class RoiIndex:
+    """Answers statistics of y over a range of x.
+
+    Points are sorted by x once so a range is two binary searches. Mean and
+    standard deviation come from prefix sums, minimum and maximum from sparse
+    tables, and the median from selection on the range.
+
+    Attributes:
+        x: The finite independent values in ascending order
+        y: The dependent values in the same order as x
+    """
+
+    def __init__(self, x: ndarray, y: ndarray):
+        finite = isfinite(x) & isfinite(y)
+        x = x[finite].astype(float64)
+        y = y[finite].astype(float64)
+        order = argsort(x, kind="stable")
+        self.x = x[order]
+        self.y = y[order]
+        # Shift by the mean so the sum of squares doesn't lose precision
+        self.shift = self.y.mean() if len(self.y) else 0.0
+        centered = self.y - self.shift
+        self.sums = concatenate(([0.0], cumsum(centered)))
+        self.squares = concatenate(([0.0], cumsum(centered * centered)))
+        self.mins = sparse_table(self.y, minimum)
+        self.maxs = sparse_table(self.y, maximum)
+
+    def bounds(self, low: float, high: float) -> Tuple[int, int]:
+        if low > high:
+            low, high = high, low
+        start = self.x.searchsorted(low, side="left")
+        stop = self.x.searchsorted(high, side="right")
+        return int(start), int(stop)
+
+    def range_min(self, start: int, stop: int) -> float:
+        level = (stop - start).bit_length() - 1
+        row = self.mins[level]
+        return float(min(row[start], row[stop - (1 << level)]))
+
+    def range_max(self, start: int, stop: int) -> float:
+        level = (stop - start).bit_length() - 1
+        row = self.maxs[level]
+        return float(max(row[start], row[stop - (1 << level)]))
+
+    def median(self, start: int, stop: int, exact: bool = True) -> float:
+        values = self.y[start:stop]
+        if not exact and len(values) > APPROXIMATE_MEDIAN_SIZE:
+            values = values[:: len(values) // APPROXIMATE_MEDIAN_SIZE]
+        middle = len(values) // 2
+        if len(values) % 2:
+            return float(partition(values, middle)[middle])
+        lower, upper = partition(values, (middle - 1, middle))[middle - 1 : middle + 1]
+        return float((lower + upper) / 2)
+
+    def stats(self, low: float, high: float, exact: bool = True) -> RoiStats:
+        start, stop = self.bounds(low, high)
+        count = stop - start
+        if count == 0:
+            return RoiStats(0, nan, nan, nan, nan, nan)
+        total = self.sums[stop] - self.sums[start]
+        squares = self.squares[stop] - self.squares[start]
+        mean = total / count
+        if count > 1:
+            std = sqrt(max(squares - count * mean * mean, 0.0) / (count - 1))
+        else:
+            std = nan
+        return RoiStats(
+            count,
+            float(mean + self.shift),
+            float(std),
+            self.median(start, stop, exact),
+            self.range_min(start, stop),
+            self.range_max(start, stop),
+        )
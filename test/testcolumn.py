@@ -0,0 +1,21 @@
+import unittest
+
+from numpy import array, int64, isnan, nan
+
+from pysimpleplotter.column import NAT, Column, ColumnType
+
+
+class TestColumn(unittest.TestCase):
+    def test_limits_skip_missing(self) -> None:
+        column = Column(array([3.0, nan, -1.0, 2.0]))
+        self.assertEqual(column.limits, (-1.0, 3.0))
+        self.assertIs(column.limits, column.limits)
+        self.assertTrue(all(isnan(limit) for limit in Column(array([nan])).limits))
+
+    def test_datetime_limits_skip_missing(self) -> None:
+        column = Column(array([NAT, 5, 2], dtype=int64), ColumnType.DATETIME)
+        self.assertEqual(column.limits, (2.0, 5.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+import gzip
+import lzma
+import unittest
+from os.path import abspath, dirname, getsize, join
+from tempfile import TemporaryDirectory
+from zipfile import ZipFile
+
+from pandas import Timestamp, isna
+
+from pysimpleplotter.column import ColumnType
+from pysimpleplotter.compression import Compression, detect, members
+from pysimpleplotter.dataset import READ_SIZE, TAIL_BYTES, Dataset
+from pysimpleplotter.dialect import NumericLocale, sniff
+from pysimpleplotter.exceptions import UnknownFileTypeError
+from pysimpleplotter.expression import compile_expression
+
+
+class TestDataset(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = join(dirname(abspath(__file__)), "data")
+        self.tmp_dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, file_name: str, text: str) -> str:
+        path = join(self.tmp_dir.name, file_name)
+        with open(path, "w", encoding="iso-8859-1") as file:
+            file.write(text)
+        return path
+
+    def test_load_perkin_elmer_tga(self) -> None:
+        df = Dataset("tga", join(self.data_dir, "PerkinElmer_TGA.txt")).load()
+        self.assertListEqual(list(df.columns), [f"col{i+1}" for i in range(6)])
+        self.assertEqual(len(df), 5573)
+        self.assertAlmostEqual(df["col4"].iloc[0], 25.004)
+
+    def test_load_parses_columns_lazily(self) -> None:
+        df = Dataset("tga", join(self.data_dir, "PerkinElmer_TGA.txt")).load()
+        self.assertAlmostEqual(df["col2"].iloc[0], 1.66191)
+        self.assertTrue(df.is_parsed("col2"))
+        self.assertFalse(df.is_parsed("col3"))
+        df.columns = ["time", "weight", "col3", "col4", "col5", "col6"]
+        self.assertTrue(df.is_parsed("weight"))
+        self.assertEqual(df["weight"].name, "weight")
+
+    def test_load_skips_mismatched_lines(self) -> None:
+        path = self.write("skip.txt", "Sample A run 4\n\ntime\tsignal\n1\t2\n\nbad\n3\t4\n")
+        df = Dataset("skip", path).load()
+        self.assertListEqual(list(df.columns), ["time", "signal"])
+        self.assertListEqual(list(df["signal"]), [2.0, 4.0])
+
+    def test_load_counts_fields_across_blocks(self) -> None:
+        rows = [f"{i}\t{i / 8}" if i % 1000 else "bad" for i in range(1, 200000)]
+        path = self.write("blocks.txt", "time\tsignal\n" + "\n".join(rows))
+        self.assertGreater(getsize(path), READ_SIZE)
+        df = Dataset("blocks", path).load()
+        self.assertEqual(len(df), 199999 - 199)
+        self.assertListEqual(list(df.line_index.skipped[:3]), [0, 1000, 2000])
+        self.assertEqual(df["signal"].iloc[-1], 199999 / 8)
+
+    def test_load_carriage_returns(self) -> None:
+        path = self.write("mac.txt", "a b\r1 2\r3 4\r")
+        dataset = Dataset("mac", path)
+        df = dataset.load()
+        self.assertEqual(len(df), 3)
+        self.assertListEqual(list(df["col2"])[1:], [2.0, 4.0])
+        lines = dataset.preview(df.line_index, 1, 5)
+        self.assertListEqual(lines, ["1 2\r", "3 4\r"])
+
+    def test_lazy_reads_check_line_splits(self) -> None:
+        # pandas ends a line at the lone carriage return, the scan does not
+        path = self.write("mixed.txt", "1\t2\n3\r4\t5\t6\n7\t8\n")
+        df = Dataset("mixed", path).load()
+        with self.assertRaisesRegex(UnknownFileTypeError, "Could not read"):
+            df.column("col2")
+
+    def test_sniff_decimal_comma(self) -> None:
+        dialect = sniff(["Wavelength;Intensity\n", "1.234,5;0,25\n", "1.300,0;0,5\n"])
+        self.assertEqual(dialect.delimiter, ";")
+        self.assertEqual(dialect.locale, NumericLocale(",", "."))
+
+    def test_sniff_comma_delimiter(self) -> None:
+        dialect = sniff(["1.5,2\n", "2.5, 3\n"])
+        self.assertEqual(dialect.delimiter, ",")
+        self.assertEqual(dialect.locale, NumericLocale())
+
+    def test_load_last_line_longer_than_tail(self) -> None:
+        row = "\t".join(f"{i}.125" for i in range(8000)) + "\n"
+        self.assertGreater(len(row), TAIL_BYTES)
+        path = self.write("wide.txt", row * 50)
+        df = Dataset("wide", path).load()
+        self.assertEqual((len(df), len(df.columns)), (50, 8000))
+        self.assertEqual(df["col8000"].iloc[-1], 7999.125)
+
+    def test_load_decimal_comma(self) -> None:
+        path = self.write("eu.txt", "Time\tSignal\n0,5\t1,25\n1,0\t2,5\n")
+        df = Dataset("eu", path).load()
+        self.assertListEqual(list(df.columns), ["Time", "Signal"])
+        self.assertListEqual(list(df["Signal"]), [1.25, 2.5])
+
+    def test_load_units_suffix(self) -> None:
+        path = self.write("units.txt", "1.5nm 20%\n2.5nm 30%\n")
+        df = Dataset("units", path).load()
+        self.assertListEqual(list(df["col1"]), [1.5, 2.5])
+        self.assertListEqual(list(df["col2"]), [20.0, 30.0])
+
+    def test_load_spaced_units(self) -> None:
+        text = "temp\thumidity\n25.5 °C\t40 %\n26 °C\t41 %\n"
+        path = self.write("spaced.txt", text)
+        df = Dataset("spaced", path).load()
+        self.assertListEqual(list(df["temp"]), [25.5, 26.0])
+        self.assertListEqual(list(df["humidity"]), [40.0, 41.0])
+
+    def test_forced_units_keep_sniffed_locale(self) -> None:
+        sample = ["1,5\t2,5\n", "3,5\t4,5\n"]
+        self.assertEqual(sniff(sample, units=True).locale, NumericLocale(",", "", True))
+
+    def test_load_explicit_locale(self) -> None:
+        path = self.write("thousands.txt", "1,234.5 2\n")
+        df = Dataset("thousands", path, NumericLocale(".", ",")).load()
+        self.assertListEqual(list(df["col1"]), [1234.5])
+
+    def test_load_datetime_and_category(self) -> None:
+        path = self.write(
+            "log.tsv",
+            "time\tstate\tcount\n"
+            "2024-01-01T00:00:00\tidle\t1\n"
+            "2024-01-01T00:00:10\trun\t2\n"
+            "\tidle\t3\n",
+        )
+        df = Dataset("log", path).load()
+        self.assertListEqual(list(df.columns), ["time", "state", "count"])
+        self.assertEqual(df.column("time").kind, ColumnType.DATETIME)
+        self.assertEqual(df["time"].iloc[1], Timestamp("2024-01-01T00:00:10"))
+        self.assertTrue(isna(df["time"].iloc[2]))
+        self.assertEqual(df.column("state").kind, ColumnType.CATEGORY)
+        self.assertListEqual(list(df["state"]), ["idle", "run", "idle"])
+        self.assertEqual(df.column("count").kind, ColumnType.INT)
+        self.assertListEqual(list(df.column("count").numeric), [1.0, 2.0, 3.0])
+
+    def test_load_compressed(self) -> None:
+        text = "time\tsignal\n1\t2\nbad\n3\t4\n".encode("iso-8859-1")
+        for compression, module in [
+            (Compression.GZIP, gzip),
+            (Compression.XZ, lzma),
+        ]:
+            path = join(self.tmp_dir.name, "data.txt.compressed")
+            with module.open(path, "wb") as file:
+                file.write(text)
+            self.assertEqual(detect(path), compression)
+            progress = []
+            df = Dataset("data", path).load(lambda read, size: progress.append(read))
+            self.assertListEqual(list(df.columns), ["time", "signal"])
+            self.assertListEqual(list(df["signal"]), [2.0, 4.0])
+            self.assertEqual(progress[-1], getsize(path))
+
+    def test_load_zip_members(self) -> None:
+        path = join(self.tmp_dir.name, "archive.zip")
+        with ZipFile(path, "w") as archive:
+            archive.writestr("runs/", "")
+            archive.writestr("runs/a.txt", "time\tsignal\n1\t2\n")
+            archive.writestr("runs/b.txt", "time\tsignal\n3\t4\n5\t6\n")
+        self.assertEqual(detect(path), Compression.ZIP)
+        self.assertListEqual(members(path), ["runs/a.txt", "runs/b.txt"])
+        df = Dataset("b", path, member="runs/b.txt").load()
+        self.assertListEqual(list(df["time"]), [3.0, 5.0])
+
+    def test_fingerprint_identifies_copies(self) -> None:
+        text = "".join(f"{i}\t{i * i}\n" for i in range(10000))
+        first = Dataset("first", self.write("first.txt", text))
+        copy = Dataset("copy", self.write("copy.txt", text))
+        changed = Dataset("changed", self.write("changed.txt", text[:-2] + "0\n"))
+        self.assertEqual(first.fingerprint(), copy.fingerprint())
+        self.assertNotEqual(first.fingerprint(), changed.fingerprint())
+        self.assertNotEqual(
+            first.fingerprint(),
+            Dataset("first", first.file_name, NumericLocale(",", "")).fingerprint(),
+        )
+
+    def test_shared_frames_parse_once(self) -> None:
+        df = Dataset("tga", join(self.data_dir, "PerkinElmer_TGA.txt")).load()
+        shared = df.share()
+        df.columns = ["time", "weight", "col3", "col4", "col5", "col6"]
+        df.define("double", compile_expression("weight * 2"))
+        self.assertListEqual(list(shared.columns), [f"col{i+1}" for i in range(6)])
+        self.assertIs(df.column("weight").values, shared.column("col2").values)
+        self.assertNotIn("double", shared)
+        with self.assertRaises(ValueError):
+            df.column("weight").values[0] = 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+import numpy as np
+
+from pysimpleplotter.column import Column
+from pysimpleplotter.exceptions import ExpressionError
+from pysimpleplotter.expression import CHUNK_SIZE, compile_expression, parse_definition
+from pysimpleplotter.frame import LazyFrame
+
+
+class TestExpression(unittest.TestCase):
+    def setUp(self):
+        self.x = np.linspace(1.0, 10.0, CHUNK_SIZE * 2 + 5)
+        self.y = np.sin(self.x)
+        self.reads = []
+
+    def read(self, positions):
+        self.reads.append(positions)
+        return [Column([self.x, self.y][i].copy()) for i in positions]
+
+    def test_evaluate_across_chunks(self) -> None:
+        expression = compile_expression("(col1 - col2) * 2 + sqrt(col1) / col1.max()")
+        result = expression.evaluate({"col1": self.x, "col2": self.y}, len(self.x))
+        expected = (self.x - self.y) * 2 + np.sqrt(self.x) / self.x.max()
+        np.testing.assert_allclose(result, expected)
+        self.assertEqual(expression.columns, ("col1", "col2"))
+
+    def test_nested_reduction(self) -> None:
+        expression = compile_expression("(col1 - col1.mean()).std() + 0 * col1")
+        result = expression.evaluate({"col1": self.x}, len(self.x))
+        self.assertAlmostEqual(result[0], self.x.std(ddof=1))
+
+    def test_quoted_names_and_definitions(self) -> None:
+        name, expression = parse_definition("wavenumber = 1e7 / `Wave length`")
+        self.assertEqual(name, "wavenumber")
+        self.assertEqual(expression.columns, ("Wave length",))
+        self.assertIsNone(parse_definition("col1 * 2")[0])
+
+    def test_rejects_unsupported_syntax(self) -> None:
+        for text in ["col1 > 2", "__import__('os')", "col1.real", "col1["]:
+            with self.assertRaises(ExpressionError):
+                compile_expression(text)
+
+    def test_derived_columns_are_lazy_and_invalidated(self) -> None:
+        df = LazyFrame(["col1", "col2"], len(self.x), self.read)
+        df.define("norm", compile_expression("col2 / col2.max()"))
+        df.define("twice", compile_expression("norm * 2"))
+        self.assertEqual(self.reads, [])
+        np.testing.assert_allclose(df["twice"], self.y / self.y.max() * 2)
+        self.assertEqual(self.reads, [[1]])
+
+        df.define("norm", compile_expression("col1"))
+        self.assertFalse(df.is_parsed("twice"))
+        np.testing.assert_allclose(df["twice"], self.x * 2)
+        self.assertEqual(self.reads, [[1], [0]])
+
+    def test_define_rejects_cycles_and_file_columns(self) -> None:
+        df = LazyFrame(["col1", "col2"], len(self.x), self.read)
+        df.define("a", compile_expression("col1 + 1"))
+        df.define("b", compile_expression("a + 1"))
+        with self.assertRaises(ExpressionError):
+            df.define("a", compile_expression("b"))
+        with self.assertRaises(ExpressionError):
+            df.define("col1", compile_expression("col2"))
+        with self.assertRaises(ExpressionError):
+            df.define("c", compile_expression("missing"))
+
+
+if __name__ == "__main__":
+    unittest.main()
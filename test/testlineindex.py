@@ -0,0 +1,77 @@
+import gzip
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from pysimpleplotter.dataset import Dataset
+from pysimpleplotter.lineindex import STRIDE, LineIndexBuilder
+
+
+class TestLineIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        rows = [f"{i}\t{i * 2}\r\n" if i % 2 else f"{i}\t{i * 2}\n" for i in range(500)]
+        rows.insert(0, "time\tsignal\n")
+        rows.insert(200, "comment\n")
+        rows.insert(300, "\n")
+        self.lines = rows
+        self.text = "".join(rows)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def load(self, file_name: str, opener=open) -> Dataset:
+        path = join(self.tmp_dir.name, file_name)
+        with opener(path, "wb") as file:
+            file.write(self.text.encode("iso-8859-1"))
+        return Dataset("data", path)
+
+    def test_index_records_skipped_lines(self) -> None:
+        dataset = self.load("data.txt")
+        df = dataset.load()
+        line_index = df.line_index
+        self.assertEqual(len(df), 500)
+        self.assertEqual(line_index.line_count, len(self.lines))
+        self.assertEqual(len(line_index.offsets), -(-len(self.lines) // STRIDE))
+        self.assertListEqual(list(line_index.skipped), [0, 200, 300])
+        self.assertEqual(line_index.header, 0)
+        self.assertEqual(line_index.next_skipped(0), 200)
+        self.assertEqual(line_index.next_skipped(200), 300)
+        self.assertIsNone(line_index.next_skipped(300))
+        self.assertEqual(line_index.previous_skipped(300), 200)
+        self.assertEqual(line_index.reason(0, self.lines[0]), "header")
+        self.assertEqual(
+            line_index.reason(200, self.lines[200]), "1 fields, expected 2"
+        )
+        self.assertEqual(line_index.reason(300, self.lines[300]), "blank")
+        self.assertEqual(line_index.reason(301, self.lines[301]), "")
+
+    def test_preview_reads_any_window(self) -> None:
+        for dataset in [self.load("data.txt"), self.load("data.gz", gzip.open)]:
+            line_index = dataset.load().line_index
+            for start in [0, 63, 64, 199, 490]:
+                self.assertListEqual(
+                    dataset.preview(line_index, start, 5), self.lines[start : start + 5]
+                )
+            self.assertListEqual(dataset.preview(line_index, 10**9, 5), [])
+
+    def test_blocks_split_anywhere_between_lines(self) -> None:
+        data = self.text.encode("iso-8859-1").rstrip(b"\n")
+        lines = data.split(b"\n")
+        builder = LineIndexBuilder()
+        for i in range(0, len(lines), 37):
+            block = b"\n".join(lines[i : i + 37])
+            builder.add_block(block + b"\n" if i + 37 < len(lines) else block)
+        starts = [0]
+        for line in lines[:-1]:
+            starts.append(starts[-1] + len(line) + 1)
+        self.assertEqual(builder.line_count, len(lines))
+        self.assertEqual(builder.offset, len(data))
+        self.assertListEqual(list(builder.offsets), starts[::STRIDE])
+        single = LineIndexBuilder()
+        single.add_block(b"no newline")
+        self.assertEqual((single.line_count, list(single.offsets)), (1, [0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
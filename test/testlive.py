@@ -0,0 +1,101 @@
+import socket
+import unittest
+from threading import Thread
+
+from numpy import arange, array, array_equal, float64, int64, isnan
+
+from pysimpleplotter.column import NAT, ColumnType
+from pysimpleplotter.dialect import Dialect
+from pysimpleplotter.live import LiveFrame, LiveSource, RingBuffer, parse_block
+
+
+class TestLive(unittest.TestCase):
+    def test_ring_buffer_keeps_the_newest_rows(self) -> None:
+        buffer = RingBuffer([float64, float64], 5)
+        values = buffer.values
+        for start in range(0, 12, 3):
+            rows = arange(start, start + 3, dtype=float)
+            buffer.append(array([rows, rows * 2]))
+        count, snapshot = buffer.snapshot()
+        self.assertEqual(count, 12)
+        self.assertListEqual(list(snapshot[0]), [7.0, 8.0, 9.0, 10.0, 11.0])
+        self.assertListEqual(list(snapshot[1]), [14.0, 16.0, 18.0, 20.0, 22.0])
+        buffer.append(array([arange(20.0), arange(20.0)]))
+        self.assertListEqual(list(buffer.snapshot()[1][0]), list(arange(15.0, 20.0)))
+        self.assertIs(buffer.values, values)
+
+    def test_refresh_keeps_earlier_columns(self) -> None:
+        buffer = RingBuffer([float64, float64], 4)
+        df = LiveFrame(["value", "sample"], [ColumnType.FLOAT], buffer)
+        columns = []
+        for start in range(0, 30, 3):
+            df.append(array([arange(start, start + 3.0)]))
+            df.refresh()
+            columns.append((start, df.column("value").values))
+        for start, values in columns:
+            first = max(0, start + 3 - 4)
+            self.assertListEqual(list(values), list(arange(first, start + 3.0)))
+        count, rows = df.buffer.since(27)
+        self.assertEqual((count, list(rows[0])), (30, [27.0, 28.0, 29.0]))
+
+    def test_parse_block_skips_mismatched_lines(self) -> None:
+        block = b"1\t2.5\n\nbad\n3\tx\n4\t5\t6\n7\t8\r\n"
+        types = [ColumnType.INT, ColumnType.FLOAT]
+        rows, skipped = parse_block(block, Dialect("\t"), types)
+        self.assertEqual(skipped, 3)
+        self.assertListEqual(list(rows[0]), [1.0, 3.0, 7.0])
+        self.assertTrue(isnan(rows[1][1]))
+        rows, skipped = parse_block(b"1 2\n  3   4 \n5\n", Dialect(), types)
+        self.assertEqual(skipped, 1)
+        self.assertListEqual(list(rows[1]), [2.0, 4.0])
+
+    def test_datetimes_keep_nanoseconds(self) -> None:
+        types = [ColumnType.DATETIME, ColumnType.FLOAT]
+        block = b"2024-01-01T00:00:00.000000001\t1\nnever\t2\n"
+        columns, _ = parse_block(block, Dialect("\t"), types)
+        buffer = RingBuffer([int64, float64, float64], 4)
+        df = LiveFrame(["time", "value", "sample"], types, buffer)
+        df.append(columns)
+        time = df.column("time")
+        self.assertEqual(time.kind, ColumnType.DATETIME)
+        self.assertListEqual(list(time.values), [1704067200000000001, NAT])
+
+    def test_stream_from_socket(self) -> None:
+        server = socket.create_server(("127.0.0.1", 0))
+        rows = 50000
+
+        def produce() -> None:
+            connection, _ = server.accept()
+            with connection:
+                connection.sendall(b"time,signal\n")
+                for start in range(0, rows, 1000):
+                    connection.sendall(
+                        "".join(
+                            f"{i / 100},{i % 7}\n" for i in range(start, start + 1000)
+                        ).encode()
+                    )
+            server.close()
+
+        producer = Thread(target=produce)
+        producer.start()
+        address = "tcp:127.0.0.1:%d" % server.getsockname()[1]
+        df = LiveSource("live", address, capacity=1 << 12).connect()
+        df.reader.join(timeout=30)
+        producer.join()
+        self.assertListEqual(list(df.columns), ["time", "signal", "sample"])
+        self.assertIsNone(df.error)
+        self.assertEqual(df.skipped, 0)
+        self.assertEqual(df.buffer.count, rows)
+        lengths = [len(values) for values in df.buffer.values]
+        self.assertListEqual(lengths, [1 << 12] * 3)
+        self.assertTrue(df.refresh())
+        self.assertFalse(df.refresh())
+        self.assertEqual(len(df), 1 << 12)
+        sample = df.column("sample").values
+        self.assertTrue(array_equal(sample, arange(rows - (1 << 12), rows)))
+        self.assertTrue(array_equal(df.column("time").values, sample / 100))
+        self.assertEqual(df["signal"].iloc[-1], (rows - 1) % 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from zipfile import ZipFile
+
+from numpy import float64
+
+from pysimpleplotter import PySimplePlotter
+from pysimpleplotter.column import ColumnType
+from pysimpleplotter.exceptions import UnknownFileTypeError
+from pysimpleplotter.live import LiveFrame, LiveSource, RingBuffer
+
+
+class TestPlotter(unittest.TestCase):
+    def setUp(self):
+        self.psp = PySimplePlotter()
+        self.tmp_dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_file_datasets_name_zip_members(self) -> None:
+        path = join(self.tmp_dir.name, "runs.zip")
+        with ZipFile(path, "w") as archive:
+            archive.mkdir("raw")
+            archive.writestr("raw/a.txt", "1\t2\n")
+            archive.writestr("b.csv", "1,2\n")
+        datasets = self.psp.file_datasets(path, None, False)
+        self.assertListEqual([d.name for d in datasets], ["runs/raw/a", "runs/b"])
+
+    def test_file_datasets_reject_empty_archives(self) -> None:
+        path = join(self.tmp_dir.name, "empty.zip")
+        with ZipFile(path, "w") as archive:
+            archive.mkdir("raw")
+        with self.assertRaisesRegex(UnknownFileTypeError, "No data files in archive"):
+            self.psp.file_datasets(path, None, False)
+
+    def test_live_status_shows_skipped_lines_and_errors(self) -> None:
+        buffer = RingBuffer([float64, float64], 10)
+        self.psp.datasets["live"] = LiveSource("live", "-", None, 10)
+        df = LiveFrame(["value", "sample"], [ColumnType.FLOAT], buffer)
+        self.psp.dfs["live"] = df
+        self.assertEqual(self.psp.live_status("live"), "Live, last 10 rows")
+        df.skipped = 2
+        df.error = OSError("Connection reset")
+        self.assertEqual(
+            self.psp.live_status("live"),
+            "Live, last 10 rows, 2 lines skipped, stopped: Connection reset",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+
+from numpy import (
+    allclose,
+    arange,
+    exp,
+    flatnonzero,
+    isnan,
+    linspace,
+    nan,
+    polyfit,
+    polyval,
+    sin,
+)
+
+from pysimpleplotter.exceptions import ProcessingError
+from pysimpleplotter.processing import (
+    Baseline,
+    Derivative,
+    Normalize,
+    Pipeline,
+    Smooth,
+)
+
+
+class TestProcessing(unittest.TestCase):
+    def setUp(self):
+        self.x = linspace(0, 10, 501)
+        self.y = sin(self.x) + exp(-((self.x - 5) ** 2))
+
+    def test_savitzky_golay(self) -> None:
+        smoothed = Smooth("Savitzky-Golay", 11, 3).apply(self.x, self.y)
+        fit = polyfit(arange(-5, 6), self.y[95:106], 3)
+        self.assertAlmostEqual(smoothed[100], polyval(fit, 0))
+
+    def test_polynomial_baseline(self) -> None:
+        line = 2 * self.x + 1
+        corrected = Baseline("Polynomial", 1).apply(self.x, line)
+        self.assertTrue(allclose(corrected, 0, atol=1e-9))
+
+    def test_missing_values_stay_local(self) -> None:
+        y = self.y.copy()
+        y[100] = nan
+        averaged = Smooth("Moving average", 5).apply(self.x, y)
+        self.assertFalse(isnan(averaged).any())
+        self.assertAlmostEqual(averaged[100], (y[98:100].sum() + y[101:103].sum()) / 4)
+        smoothed = Smooth("Savitzky-Golay", 11, 3).apply(self.x, y)
+        self.assertFalse(isnan(smoothed).any())
+        fit = polyfit(arange(-5, 6), y[115:126], 3)
+        self.assertAlmostEqual(smoothed[120], polyval(fit, 0))
+        corrected = Baseline("Asymmetric least squares").apply(self.x, y)
+        self.assertListEqual(list(flatnonzero(isnan(corrected))), [100])
+        y[200:220] = nan
+        smoothed = Smooth("Savitzky-Golay", 11, 3).apply(self.x, y)
+        self.assertListEqual(
+            list(flatnonzero(isnan(smoothed))), list(range(205, 215))
+        )
+
+    def test_rejects_invalid_parameters(self) -> None:
+        with self.assertRaises(ProcessingError):
+            Smooth("Savitzky-Golay", 11, -1)
+        with self.assertRaises(ProcessingError):
+            Baseline("Asymmetric least squares", p=1.5)
+
+    def test_derivative(self) -> None:
+        derivative = Derivative(1).apply(self.x, self.x**2)
+        self.assertTrue(allclose(derivative[1:-1], 2 * self.x[1:-1]))
+
+    def test_short_and_missing_series(self) -> None:
+        missing = self.y * nan
+        corrected = Baseline("Polynomial", 2).apply(self.x, missing)
+        self.assertTrue(isnan(corrected).all())
+        derivative = Derivative(1).apply(self.x[:1], self.y[:1])
+        self.assertTrue(isnan(derivative).all())
+        empty = self.x[:0]
+        stages = (Normalize("Maximum"), Derivative(2))
+        self.assertEqual(len(Pipeline().run("y", empty, empty, stages)), 0)
+
+    def test_pipeline_reruns_downstream_stages(self) -> None:
+        pipeline = Pipeline()
+        smooth = Smooth("Moving average", 5)
+        pipeline.run("v1", self.x, self.y, (smooth, Normalize("Maximum")))
+        smoothed = pipeline.cache[("v1", (smooth,))]
+        result = pipeline.run("v1", self.x, self.y, (smooth, Normalize("Min-max")))
+        self.assertIs(pipeline.cache[("v1", (smooth,))], smoothed)
+        self.assertEqual(result.min(), 0.0)
+        self.assertEqual(len(pipeline.cache), 3)
+
+    def test_pipeline_limits(self) -> None:
+        pipeline = Pipeline()
+        stages = (Normalize("Min-max"),)
+        self.assertEqual(pipeline.limits("v1", self.x, self.y, stages), (0.0, 1.0))
+        self.assertIn(("v1", stages), pipeline.output_limits)
+        self.assertEqual(pipeline.limits("v1", self.x, self.x, ()), (0.0, 10.0))
+
+    def test_pipeline_evict(self) -> None:
+        pipeline = Pipeline()
+        stages = (Normalize("Min-max"),)
+        pipeline.limits("v1", self.x, self.y, stages)
+        pipeline.run("v2", self.x, self.y, stages)
+        pipeline.evict(lambda version: version == "v1")
+        self.assertListEqual([key[0] for key in pipeline.cache], ["v2"])
+        self.assertNotIn(("v1", stages), pipeline.output_limits)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import unittest
+from dataclasses import replace
+from os.path import exists, join
+from tempfile import TemporaryDirectory
+from typing import Callable, List
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from numpy import arange, asarray, array_equal, linspace, nan, nanmax, sin
+
+from pysimpleplotter.renderer import (
+    GRID_MARGINS,
+    GridSpec,
+    Layers,
+    Panel,
+    PlotSpec,
+    Rendering,
+    RenderWorker,
+    Trace,
+    decimate,
+    figure,
+    grid_shape,
+    padded,
+    render_grid,
+    style,
+)
+
+
+class TestRenderer(unittest.TestCase):
+    def test_grid_shape(self) -> None:
+        self.assertEqual(grid_shape(1), (1, 1))
+        self.assertEqual(grid_shape(7), (3, 3))
+        self.assertEqual(grid_shape(12), (3, 4))
+        self.assertEqual(grid_shape(200), (14, 15))
+
+    def test_padded_skips_missing_limits(self) -> None:
+        self.assertIsNone(padded((nan, nan)))
+
+    def test_render_grid_composites_panels(self) -> None:
+        x = linspace(0, 10, 100)
+        panels = tuple(
+            Panel(f"run {i}", (Trace(x, sin(x + i), "#000000", f"run {i}"),))
+            for i in range(5)
+        )
+        spec = GridSpec(panels, (0.0, 10.0), (-1.0, 1.0), "Runs", size=(400, 300))
+        rendering = render_grid(spec)
+        self.assertEqual(rendering.image.shape, (300, 400, 4))
+        self.assertEqual(rendering.x_limits, padded((0.0, 10.0)))
+        left, top, right, bottom = rendering.axes_box
+        self.assertTrue(GRID_MARGINS[0] < left < right < GRID_MARGINS[0] + 400 / 3)
+        self.assertTrue(GRID_MARGINS[1] < top < bottom < GRID_MARGINS[1] + 300 / 2)
+        # The sixth cell of the 2 x 3 grid is left empty
+        self.assertEqual(len({tuple(p) for p in rendering.image[250, 300:390]}), 1)
+
+    def test_render_grid_converts_datetime_limits(self) -> None:
+        x = linspace(0, 10, 100)
+        y = arange(100).astype("datetime64[s]").astype("datetime64[ns]")
+        panels = (Panel("a", (Trace(x, y, "#000000", "a"),)),)
+        y_limits = (0.0, 99e9)
+        spec = GridSpec(panels, (0.0, 10.0), y_limits, "Dates", size=(200, 150))
+        self.assertEqual(render_grid(spec).image.shape, (150, 200, 4))
+
+    def test_decoration_edits_reuse_the_data_layer(self) -> None:
+        x = linspace(0, 10, 100)
+        spec = PlotSpec((Trace(x, sin(x), "#000000", "sine"),), "Before", "x", "y")
+        layers = Layers(spec)
+        edited = replace(spec, title="After", y_label="Signal", legend=True)
+        self.assertTrue(layers.fits(edited))
+        moved = replace(spec, traces=(Trace(x, x, "#000000", "sine"),))
+        self.assertFalse(layers.fits(moved))
+        rendering = layers.render(edited)
+        with style(edited):
+            canvas = FigureCanvasAgg(figure(edited))
+            canvas.draw()
+        self.assertTrue(array_equal(rendering.image, asarray(canvas.buffer_rgba())))
+
+    def test_render_grid_reuses_cached_panels(self) -> None:
+        x = linspace(0, 10, 100)
+        panels = (Panel("a", (Trace(x, sin(x), "#000000", "a"),)),)
+        spec = GridSpec(panels, (0.0, 10.0), (-1.0, 1.0), "Before", size=(200, 150))
+        cache = {}
+        render_grid(spec, cache=cache)
+        ((job, image),) = cache.values()
+        rendering = render_grid(replace(spec, title="After"), cache=cache)
+        self.assertIs(next(iter(cache.values()))[1], image)
+        uncached = render_grid(replace(spec, title="After"))
+        self.assertTrue(array_equal(rendering.image, uncached.image))
+
+    def test_animated_frames_move_lines_in_place(self) -> None:
+        x = arange(1000.0)
+        spec = PlotSpec((Trace(x, sin(x), "#000000", "live"),), animated=True)
+        layers = Layers(spec)
+        layers.render(spec)
+        (line,) = layers.fig.axes[0].get_lines()
+        background = layers.background
+        quieter = replace(spec, traces=(Trace(x, sin(x) * 0.9, "#000000", "live"),))
+        self.assertTrue(layers.fits(quieter))
+        layers.render(quieter)
+        self.assertIs(layers.fig.axes[0].get_lines()[0], line)
+        self.assertIs(layers.background, background)
+        self.assertAlmostEqual(line.get_ydata().max(), 0.9, places=3)
+        later = replace(spec, traces=(Trace(x + 2000, sin(x), "#000000", "live"),))
+        layers.render(later)
+        self.assertIsNot(layers.background, background)
+        low, high = layers.fig.axes[0].get_xlim()
+        self.assertTrue(low <= 2000 and 2999 <= high)
+
+    def test_decimate_keeps_the_envelope(self) -> None:
+        x = arange(100000.0)
+        y = sin(x / 100)
+        y[500] = nan
+        small_x, small_y = decimate(x, y, 100)
+        self.assertEqual(len(small_x), 200)
+        self.assertEqual(small_y.max(), nanmax(y))
+        self.assertTrue(array_equal(small_y, y[small_x.astype(int)]))
+
+    def run_worker(self, request: Callable[[RenderWorker], None]) -> List:
+        """Queues requests before the worker starts and collects deliveries."""
+        delivered = []
+        worker = RenderWorker(delivered.append)
+        request(worker)
+        worker.start()
+        worker.stop()
+        worker.thread.join(timeout=30)
+        return delivered
+
+    def test_render_worker_delivers_the_newest_plot(self) -> None:
+        x = linspace(0, 10, 100)
+
+        def request(worker: RenderWorker) -> None:
+            for title in ("Old", "New"):
+                trace = Trace(x, sin(x), "#000000", "sine")
+                worker.submit(PlotSpec((trace,), title, "x", "y"))
+
+        (rendering,) = self.run_worker(request)
+        self.assertIsInstance(rendering, Rendering)
+        self.assertEqual(rendering.generation, 2)
+
+    def test_render_worker_saves_and_delivers_errors(self) -> None:
+        x = linspace(0, 10, 100)
+        spec = PlotSpec((Trace(x, sin(x), "#000000", "sine"),), "Saved", "x", "y")
+        with TemporaryDirectory() as tmp_dir:
+            saved = join(tmp_dir, "plot.png")
+
+            def request(worker: RenderWorker) -> None:
+                worker.save(spec, saved)
+                worker.save(spec, join(tmp_dir, "plot.xyz"))
+
+            (error,) = self.run_worker(request)
+            self.assertTrue(exists(saved))
+        self.assertIsInstance(error, ValueError)
+
+
+if __name__ == "__main__":
+    unittest.main()
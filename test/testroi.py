@@ -0,0 +1,34 @@
+import unittest
+
+from numpy import array, isnan, nan
+
+from pysimpleplotter.roi import RoiIndex
+
+
+class TestRoiIndex(unittest.TestCase):
+    def setUp(self):
+        x = array([5.0, 1.0, 4.0, 2.0, 3.0, nan, 6.0])
+        y = array([50.0, 10.0, 40.0, 20.0, 30.0, 99.0, nan])
+        self.index = RoiIndex(x, y)
+
+    def test_stats(self) -> None:
+        stats = self.index.stats(2.0, 4.5)
+        self.assertEqual(stats.count, 3)
+        self.assertAlmostEqual(stats.mean, 30.0)
+        self.assertAlmostEqual(stats.std, 10.0)
+        self.assertEqual(stats.median, 30.0)
+        self.assertEqual(stats.min, 20.0)
+        self.assertEqual(stats.max, 40.0)
+
+    def test_reversed_bounds(self) -> None:
+        self.assertEqual(self.index.stats(5.0, 1.0).median, 30.0)
+        self.assertEqual(self.index.stats(1.5, 4.0).median, 30.0)
+
+    def test_empty_range(self) -> None:
+        stats = self.index.stats(10.0, 20.0)
+        self.assertEqual(stats.count, 0)
+        self.assertTrue(isnan(stats.mean))
+
+
+if __name__ == "__main__":
+    unittest.main()